@@ -27,7 +27,9 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import logging
 import time
+
 import torch
 
 from patrickstar.manager import PatrickStarManager
@@ -38,6 +40,24 @@ from .const import TensorState, ChunkState
 
 
 class Chunk(object):
+    __slots__ = (
+        "chunk_id",
+        "capacity",
+        "data_type",
+        "local_rank",
+        "_is_dummy",
+        "_pinned_pool",
+        "_state_dict",
+        "unused",
+        "payload",
+        "_free_tensors_zeroed",
+        "_time_profile",
+        "gpu_access_moments",
+        "cpu_access_moments",
+        "_pin_flag",
+        "_copy_event",
+    )
+
     def __init__(
         self,
         capacity: int,
@@ -45,6 +65,7 @@ class Chunk(object):
         chunk_id: int,
         local_rank: int = 0,
         is_dummy: bool = False,
+        pinned_pool=None,
     ):
         r"""
         Chunk is the minimal unit of the data transfer.
@@ -60,6 +81,9 @@ class Chunk(object):
             chunk_id: int.
             local_rank: int.
             is_dummy: bool.
+            pinned_pool: the object providing `acquire_pinned` and `release_pinned`
+                to reuse the pinned CPU payloads, usually the :class:`ChunkList`
+                owning the chunk. If None, CPU payloads are allocated every time.
         """
         self.chunk_id = chunk_id
         # payload numel does not equal to capacity. payload can be None.
@@ -67,6 +91,7 @@ class Chunk(object):
         self.data_type = data_type
         self.local_rank = local_rank
         self._is_dummy = is_dummy
+        self._pinned_pool = pinned_pool
 
         # the number of tensors of the chunk in each state
         self._state_dict = {
@@ -80,11 +105,17 @@ class Chunk(object):
         self.unused = 0
 
         self.payload = None
+        # Whether the memory of all `FREE` tensors in the payload is still zero,
+        # i.e. no tensor has been set back to `FREE` since the payload was allocated.
+        self._free_tensors_zeroed = False
         self._time_profile = True
 
         self.gpu_access_moments = []
         self.cpu_access_moments = []
         self._pin_flag = False
+        # The event of the async copy to the CUDA payload that the compute
+        # stream has not waited for yet. See `wait_copy`.
+        self._copy_event = None
 
     def append_moment(self, mom, compute_device):
         mgr = PatrickStarManager()
@@ -168,13 +199,18 @@ class Chunk(object):
 
         payload_size = self.capacity
         if device.type == "cpu":
-            self.payload = torch.zeros(
-                payload_size, dtype=self.data_type, device=device, pin_memory=True
-            )
+            self.payload = self._acquire_pinned_payload()
+            self.payload.zero_()
         else:
+            # NOTE() The CUDA payloads stay on the default caching allocator
+            # instead of a private memory pool. Chunks are moved out of GPU to
+            # make room for activations, and the memory they free has to be
+            # reusable by the activations, which a private pool would prevent.
+            # The CPU payloads are exact-size buffers from the pinned pool.
             self.payload = torch.zeros(
                 payload_size, dtype=self.data_type, device=device
             )
+        self._free_tensors_zeroed = True
         mgr = PatrickStarManager()
         mgr.add(device.type, self.get_payload_space())
 
@@ -191,10 +227,13 @@ class Chunk(object):
 
         NOTE() Please make sure all tensors are in the `FREE` state.
         """
+        self.wait_copy()
         mgr = PatrickStarManager()
         mgr.delete(self.get_device().type, self.get_payload_space())
 
         # Remove the memory of the chunk.
+        if self.payload.device.type == "cpu":
+            self._release_pinned_payload(self.payload)
         del self.payload
         self.payload = None
 
@@ -212,6 +251,18 @@ class Chunk(object):
         """
         self._state_dict[old_state] -= 1
         self._state_dict[new_state] += 1
+        # A tensor set back to `FREE` may leave its data in the payload.
+        if new_state == TensorState.FREE and old_state != TensorState.FREE:
+            self._free_tensors_zeroed = False
+
+    def free_tensors_zeroed(self):
+        r"""If the memory of all `FREE` tensors in the payload is zero.
+
+        The payload is zero when allocated and the memory of a `FREE` tensor
+        is not handed out, so the zeroing of a `FREE` tensor on access can be
+        skipped until some tensor is set back to `FREE`.
+        """
+        return self.payload is not None and self._free_tensors_zeroed
 
     def get_state(self):
         """
@@ -262,13 +313,18 @@ class Chunk(object):
         # TODO(zilinzhu) Find a better way to represent the unused tensors
         self.unused = self._state_dict[TensorState.HOLD]
 
-    def move(self, target_device: torch.device):
+    def move(self, target_device: torch.device, non_blocking: bool = False):
         r"""
         Move the chunk to `target_device`.
         NOTE() Please check if the `target_device` has enough room before.
 
         Args:
             target_device: :class:`torch.device`.
+            non_blocking: bool. If True, return without waiting for the copy.
+                When moving to CPU, the caller must synchronize
+                `PatrickStarManager().copy_stream` before the CPU payload is used.
+                When moving to GPU, the caller must call `wait_copy` before the
+                CUDA payload is used.
         """
         if self.get_device() is None:
             logger.warning(f"chunk move payload None to {target_device}")
@@ -277,48 +333,71 @@ class Chunk(object):
             return
         if self._time_profile:
             if target_device.type == "cuda":
-                global_timer.my_timer.start_profile("chunk_cpu_gpu_move")
+                profile_name = "chunk_cpu_gpu_move"
             else:
-                global_timer.my_timer.start_profile("chunk_gpu_cpu_move")
+                profile_name = "chunk_gpu_cpu_move"
+            # NOTE() The host only waits for the copy when moving to CPU without
+            # `non_blocking`. Otherwise the timer only measures enqueueing the
+            # copy, so it is recorded under its own name, with no bandwidth.
+            if target_device.type == "cuda" or non_blocking:
+                profile_name += global_timer.ENQUEUE_SUFFIX
+            global_timer.my_timer.start_profile(profile_name)
+        self.wait_copy()
         src_device = self.get_device()
+        payload_space = self.get_payload_space()
         mgr = PatrickStarManager()
 
-        logger.debug(
-            f"move chunk {self.chunk_id}, which has {self.payload.numel() / 1e6} M {self.payload.dtype} elements, "
-            f"from {src_device} to {target_device}, "
-            f"used mem {mgr.used_chunk_mem(target_device.type) / 1e6} MB"
-        )
+        # Chunks are moved many times per iteration, only build the message
+        # when it will be printed.
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"move chunk {self.chunk_id}, which has {self.payload.numel() / 1e6} M {self.payload.dtype} elements, "
+                f"from {src_device} to {target_device}, "
+                f"used mem {mgr.used_chunk_mem(target_device.type) / 1e6} MB"
+            )
 
-        # TODO(jiaruifang) asyc copy.
+        # The copy is issued on the copy stream after the pending kernels on
+        # the current stream, so it will not read a payload still being written.
+        compute_stream = torch.cuda.current_stream()
+        mgr.copy_stream.wait_stream(compute_stream)
         if target_device.type == "cpu":
-            pinned_payload_cpu = torch.empty(
-                self.payload.shape,
-                dtype=self.payload.dtype,
-                device="cpu:0",
-                pin_memory=True,
-            )
+            pinned_payload_cpu = self._acquire_pinned_payload()
             with torch.cuda.stream(mgr.copy_stream):
-                pinned_payload_cpu.copy_(self.payload)
+                pinned_payload_cpu.copy_(self.payload, non_blocking=True)
+            if non_blocking:
+                # Keep the CUDA memory from being reused before the copy finishes.
+                self.payload.record_stream(mgr.copy_stream)
+            else:
+                # The CPU payload may be read by the host right after the move.
+                mgr.copy_stream.synchronize()
             self.payload = pinned_payload_cpu
         elif target_device.type == "cuda":
-            self.payload = self.payload.pin_memory()
+            # The CPU payload is allocated in pinned memory, only fall back to
+            # pinning for payloads that are not.
+            if not self.payload.is_pinned():
+                self.payload = self.payload.pin_memory()
+            cuda_payload = torch.empty(
+                self.payload.shape, dtype=self.payload.dtype, device=target_device
+            )
             with torch.cuda.stream(mgr.copy_stream):
-                self.payload = self.payload.to(target_device)
+                cuda_payload.copy_(self.payload, non_blocking=True)
+                copy_event = torch.cuda.Event()
+                copy_event.record()
+            # Kernels on the compute stream using the payload wait for the
+            # copy on device, the host is not blocked.
+            if non_blocking:
+                self._copy_event = copy_event
+            else:
+                compute_stream.wait_stream(mgr.copy_stream)
+            # The pinned buffer can only be reused after the copy finishes.
+            self._release_pinned_payload(self.payload, copy_event)
+            self.payload = cuda_payload
 
-        mgr.delete(src_device.type, self.get_payload_space())
-        mgr.add(target_device.type, self.get_payload_space())
+        mgr.transfer(src_device.type, target_device.type, payload_space)
 
         if self._time_profile:
-            if target_device.type == "cuda":
-                global_timer.my_timer.finish_profile("chunk_cpu_gpu_move")
-                global_timer.data_move_cnter.update(
-                    "chunk_cpu_gpu_move", self.get_payload_space()
-                )
-            elif target_device.type == "cpu":
-                global_timer.my_timer.finish_profile("chunk_gpu_cpu_move")
-                global_timer.data_move_cnter.update(
-                    "chunk_gpu_cpu_move", self.get_payload_space()
-                )
+            global_timer.my_timer.finish_profile(profile_name)
+            global_timer.data_move_cnter.update(profile_name, payload_space)
 
         if profiler.started():
             if len(profiler.chunk_life_cycle[self.chunk_id]["life_cycle"]) == 0:
@@ -330,6 +409,28 @@ class Chunk(object):
                 (time.time(), "move", target_device)
             )
 
+    def wait_copy(self):
+        r"""Make the current stream wait for the pending async copy to the payload.
+
+        Needed before using a payload moved to GPU with `non_blocking=True`.
+        """
+        if self._copy_event is not None:
+            torch.cuda.current_stream().wait_event(self._copy_event)
+            self._copy_event = None
+
+    def _acquire_pinned_payload(self):
+        r"""Get a pinned CPU buffer of `capacity` elements for the payload."""
+        if self._pinned_pool is not None:
+            return self._pinned_pool.acquire_pinned(self.capacity, self.data_type)
+        return torch.empty(
+            self.capacity, dtype=self.data_type, device="cpu:0", pin_memory=True
+        )
+
+    def _release_pinned_payload(self, payload, event=None):
+        r"""Give the pinned CPU buffer back to the pool."""
+        if self._pinned_pool is not None and payload.is_pinned():
+            self._pinned_pool.release_pinned(payload, event)
+
     def get_device(self):
         r"""Get device of the payload of chunk, return None if not allocated."""
         if self.payload is not None:
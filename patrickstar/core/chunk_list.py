@@ -27,12 +27,12 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from queue import PriorityQueue
-from typing import List
+import heapq
+from typing import Dict, List, Tuple
 
 import torch
 
-from patrickstar.core.const import ChunkType
+from patrickstar.core.const import ChunkType, TrainingStage
 from patrickstar.manager import PatrickStarManager
 from patrickstar.profiler import profiler
 from patrickstar.utils import logger, get_rank, get_world_size
@@ -65,6 +65,23 @@ class ChunkList(object):
         self._time_profile = True
         self.moments_cnt_of_iteration = None
         self.local_rank = local_rank
+        # The process group is set up before the chunk list is created and
+        # does not change afterwards.
+        self._world_size = get_world_size()
+        self._global_rank = get_rank()
+
+        # (capacity, dtype) -> list of (pinned buffer, event). Chunks are long-lived
+        # and of the same few sizes, so the pinned CPU payloads are reused instead
+        # of going through the host allocator on every move.
+        self._pinned_pool: Dict[Tuple[int, torch.dtype], List] = {}
+        # data_ptr -> buffer registered with `cudaHostRegister` by `_alloc_pinned`.
+        # The buffers are kept alive here, so that none of them is freed while
+        # still registered, and are unregistered in `close`.
+        self._registered_pinned: Dict[int, torch.Tensor] = {}
+
+        # moment -> list of param fp16 chunk_ids accessed on GPU at the moment.
+        # Built from the access moments recorded during warmup.
+        self._gpu_access_schedule: Dict[int, List[int]] = None
 
     def chunk_ids_generator(self, chunk_type: ChunkType):
         r"""Return the chunk_id of all chunks with type `chunk_type`
@@ -94,19 +111,96 @@ class ChunkList(object):
     def get_chunk_memory_used(self, device):
         r"""The total memory of payload of all chunks on `device`.
 
+        Every payload allocation, release and move is accounted in
+        `PatrickStarManager`, so its running total is returned instead of
+        summing over all chunks.
+
         Args:
             device: :class:`torch.device`.
         Returns:
             float.
         """
-        mem_used = 0
-        for _, chunk in self.id_to_chunk_map.items():
-            if (
-                chunk.get_device() is not None
-                and chunk.get_device().type == device.type
-            ):
-                mem_used += chunk.get_payload_space()
-        return mem_used
+        return PatrickStarManager().used_chunk_mem(device.type)
+
+    def acquire_pinned(self, capacity: int, dtype: torch.dtype):
+        r"""Get a pinned CPU buffer of `capacity` elements of `dtype`.
+
+        The content of the buffer is undefined.
+
+        Args:
+            capacity: int.
+            dtype: :class:`torch.dtype`.
+        Returns:
+            :class:`torch.Tensor`.
+        """
+        buf_list = self._pinned_pool.get((capacity, dtype))
+        if buf_list:
+            buf, event = buf_list.pop()
+            # Wait for the async copy still reading the buffer.
+            if event is not None:
+                event.synchronize()
+            return buf
+        return self._alloc_pinned(capacity, dtype)
+
+    def _alloc_pinned(self, capacity: int, dtype: torch.dtype):
+        r"""Allocate a pinned CPU buffer of exactly `capacity` elements.
+
+        The pinned allocator of pytorch rounds the size up to power of 2,
+        which may almost double the host memory of a chunk. As the buffers
+        of the pool are never freed, allocate a pageable tensor and register
+        it in place with `cudaHostRegister` instead, it is unregistered in
+        `close`. Fall back to the pinned allocator if the registration is not
+        available.
+        """
+        buf = torch.empty(capacity, dtype=dtype, device="cpu:0")
+        cudart = torch.cuda.cudart()
+        if hasattr(cudart, "cudaHostRegister"):
+            assert buf.is_contiguous()
+            ret = cudart.cudaHostRegister(
+                buf.data_ptr(), buf.numel() * buf.element_size(), 0
+            )
+            if int(ret) == 0:
+                self._registered_pinned[buf.data_ptr()] = buf
+                return buf
+            logger.warning(
+                f"cudaHostRegister failed with error {ret}, use the pinned allocator."
+            )
+        return torch.empty(capacity, dtype=dtype, device="cpu:0", pin_memory=True)
+
+    def release_pinned(self, buf: torch.Tensor, event=None):
+        r"""Return a pinned CPU buffer to the pool for reuse.
+
+        Args:
+            buf: :class:`torch.Tensor`. A 1-D pinned CPU tensor.
+            event: :class:`torch.cuda.Event`. The buffer is not reused before
+                the event completes. None if there is no pending copy.
+        """
+        key = (buf.numel(), buf.dtype)
+        if key not in self._pinned_pool:
+            self._pinned_pool[key] = []
+        self._pinned_pool[key].append((buf, event))
+
+    def close(self):
+        r"""Unregister the pinned buffers registered by `_alloc_pinned`.
+
+        The buffers, including the CPU payloads of the chunks, stay valid as
+        pageable memory. The pooled ones are dropped.
+        """
+        registered = self._registered_pinned
+        if not registered:
+            return
+        self._registered_pinned = {}
+        self._pinned_pool = {}
+        cudart = torch.cuda.cudart()
+        for ptr in registered:
+            ret = cudart.cudaHostUnregister(ptr)
+            if int(ret) != 0:
+                logger.warning(f"cudaHostUnregister failed with error {ret}.")
+
+    def __del__(self):
+        # `__init__` may not have finished.
+        if getattr(self, "_registered_pinned", None):
+            self.close()
 
     def max_chunk_size(self):
         max_size = 0
@@ -119,9 +213,8 @@ class ChunkList(object):
 
         1. standalone mode
         In standalone mode, we need to move the chunk when it is on other devices.
-            TODO(jiaruifang) Add async copy and record the lifecycle of chunks during
-            the first iteration, so that we can prefetch the next chunk after sync
-            the memcopy of the first chunk.
+        After warmup, the param fp16 chunks accessed on GPU at the next moment
+        are prefetched asynchronously, see `_prefetch_next_moment_chunks`.
         2. distributed mode
         Use allgather to fetch chunks from other processes.
 
@@ -146,7 +239,7 @@ class ChunkList(object):
         # In distributed mode, we need a global payload.
         if chunk_state == ChunkState.RELEASED:
             logger.debug(
-                f"rank {get_rank()} access_chunk chunk {chunk_id}, "
+                f"rank {self._global_rank} access_chunk chunk {chunk_id}, "
                 f"need to allocate {payload_space} B memory on {compute_device}"
             )
 
@@ -160,9 +253,52 @@ class ChunkList(object):
             assert (
                 chunk.get_device().type == compute_device.type
             ), f"chunk device {chunk.get_device()} compute device {compute_device}"
-            return
         else:
             logger.debug(f"access_chunk chunk {chunk_id} already on {compute_device}")
+            # The chunk may have been prefetched.
+            chunk.wait_copy()
+
+        if compute_device.type == "cuda" and mgr.is_nonwarmup_training():
+            self._prefetch_next_moment_chunks(compute_device)
+
+    def _get_gpu_access_schedule(self):
+        if self._gpu_access_schedule is None:
+            self._gpu_access_schedule = {}
+            for chunk_id in self.chunk_type_to_id_list_map[ChunkType.PARAM_FP16]:
+                for mom in self.id_to_chunk_map[chunk_id].gpu_access_moments:
+                    if mom not in self._gpu_access_schedule:
+                        self._gpu_access_schedule[mom] = []
+                    self._gpu_access_schedule[mom].append(chunk_id)
+        return self._gpu_access_schedule
+
+    def _prefetch_next_moment_chunks(self, compute_device: torch.device):
+        r"""Start moving the chunks accessed at the next moment to `compute_device`.
+
+        The copies are issued on the copy stream, so they overlap with the
+        computation of the current moment. Only param fp16 chunks are prefetched
+        during FWD and BWD, and only into free chunk memory, nothing is evicted
+        for prefetching.
+
+        Args:
+            compute_device: :class:`torch.device`.
+        """
+        mgr = PatrickStarManager()
+        if mgr.get_training_stage() not in (TrainingStage.FWD, TrainingStage.BWD):
+            return
+        next_mom = mgr.metronome.next_moment()
+        for chunk_id in self._get_gpu_access_schedule().get(next_mom, []):
+            chunk = self.id_to_chunk_map[chunk_id]
+            if (
+                chunk.get_device() is None
+                or chunk.get_device().type == compute_device.type
+                or chunk.get_state() == ChunkState.COMPUTE
+                or chunk.is_pin()
+            ):
+                continue
+            if mgr.free_chunk_mem(compute_device.type) < chunk.get_payload_space():
+                break
+            logger.debug(f"prefetch chunk {chunk_id} to {compute_device}")
+            chunk.move(compute_device, non_blocking=True)
 
     def prepare_device(self, target_device: torch.device, need_bytes: int):
         """
@@ -232,8 +368,7 @@ class ChunkList(object):
         )
 
         # Move the chunk to new device. If there are not enough space on the new device, abort.
-        for idx in moved_list:
-            self.chunk_move(idx, new_device)
+        self._batch_chunk_move(moved_list, new_device)
 
         if self._time_profile:
             global_timer.my_timer.finish_profile("CHUNK_LIST_prepare_device")
@@ -260,13 +395,30 @@ class ChunkList(object):
             else torch.device(f"cuda:{self.local_rank}")
         )
 
-        for idx in moved_list:
-            self.chunk_move(idx, new_device)
+        self._batch_chunk_move(moved_list, new_device)
 
         if self._time_profile:
             global_timer.my_timer.finish_profile("CHUNK_LIST_make_room")
 
-    def chunk_move(self, chunk_id: int, device: torch.device):
+    def _batch_chunk_move(self, chunk_id_list: List[int], device: torch.device):
+        r"""Move the chunks of `chunk_id_list` to `device`.
+
+        The copies of all chunks are issued on the copy stream back to back
+        and only synchronized once at the end.
+
+        Args:
+            chunk_id_list: list of int.
+            device: :class:`torch.device`.
+        """
+        non_blocking = device.type == "cpu"
+        for chunk_id in chunk_id_list:
+            self.chunk_move(chunk_id, device, non_blocking=non_blocking)
+        if len(chunk_id_list) > 0 and non_blocking:
+            PatrickStarManager().copy_stream.synchronize()
+
+    def chunk_move(
+        self, chunk_id: int, device: torch.device, non_blocking: bool = False
+    ):
         r"""Move chunk of id `chunk_id` to `device`.
 
         NOTE(): Please make sure `device` has enough free_chunk_mem before.
@@ -274,6 +426,7 @@ class ChunkList(object):
         Args:
             chunk_id: int.
             device: :class:`torch.device`.
+            non_blocking: bool. See :meth:`Chunk.move`.
         """
         if self._time_profile:
             global_timer.my_timer.start_profile("CHUNK_LIST_chunk_move")
@@ -292,7 +445,7 @@ class ChunkList(object):
             )
         if chunk.get_device() != device:
             logger.debug(f"move chunk {chunk_id} from {chunk.get_device()} to {device}")
-            chunk.move(device)
+            chunk.move(device, non_blocking=non_blocking)
 
         if self._time_profile:
             global_timer.my_timer.finish_profile("CHUNK_LIST_chunk_move")
@@ -326,9 +479,9 @@ class ChunkList(object):
             chunk_id=chunk_id,
             local_rank=self.local_rank,
             is_dummy=is_dummy,
+            pinned_pool=self,
         )
-        world_size = get_world_size()
-        global_rank = get_rank()
+        world_size = self._world_size
         self.chunk_type_to_id_list_map[chunk_type].append(chunk_id)
         if profiler.started():
             profiler.chunk_life_cycle[chunk_id] = {"type": chunk_type, "life_cycle": []}
@@ -339,7 +492,7 @@ class ChunkList(object):
             offset=(num_type_chunk - 1) % world_size,
         )
         logger.debug(
-            f"global_rank {global_rank}, allocate with new chunk chunk_id {chunk_id} size {chunk_size} "
+            f"global_rank {self._global_rank}, allocate with new chunk chunk_id {chunk_id} size {chunk_size} "
             f"data_type {data_type} comm group {comm_info}"
         )
         return comm_info
@@ -381,7 +534,8 @@ class ChunkList(object):
 
         movable_chunk_info = []
 
-        q = PriorityQueue()
+        q = []
+        max_payload_space = 0
         for chunk_id, chunk in self.id_to_chunk_map.items():
             if (
                 chunk.get_device() is not None
@@ -393,16 +547,30 @@ class ChunkList(object):
                 next_mom = chunk.next_accessed_mom(target_device)
                 # Order by `next_mom`s, from large to small
                 # and by chunk_ids if `next_mom` are the same (only happens during warmup).
-                q.put((-next_mom, chunk_id))
+                q.append((-next_mom, chunk_id))
                 movable_chunk_info.append(f"{next_mom}_{chunk_id}")
+                max_payload_space = max(max_payload_space, chunk.get_payload_space())
             # TODO(jiaruifang) Do not release `FREE` chunks immediately for reuse.
             # assert chunk.get_state() != ChunkState.FREE
-        while not q.empty():
-            next_mom, chunk_id = q.get()
-            moved_bytes += self.id_to_chunk_map[chunk_id].get_payload_space()
-            moved_list.append(chunk_id)
-            if moved_bytes >= still_need_bytes:
+
+        # Usually only a few chunks need to be moved, so only select the first
+        # `k` candidates instead of ordering all of them. `k` is the lower bound
+        # of the number of chunks needed and is doubled if they are not enough.
+        if max_payload_space > 0:
+            k = max(1, -(-still_need_bytes // max_payload_space))
+        else:
+            k = len(q)
+        while True:
+            moved_bytes = 0
+            moved_list = []
+            for _, chunk_id in heapq.nsmallest(k, q):
+                moved_bytes += self.id_to_chunk_map[chunk_id].get_payload_space()
+                moved_list.append(chunk_id)
+                if moved_bytes >= still_need_bytes:
+                    break
+            if moved_bytes >= still_need_bytes or k >= len(q):
                 break
+            k *= 2
 
         mgr = PatrickStarManager()
         logger.info(
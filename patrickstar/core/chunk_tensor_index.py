@@ -27,7 +27,8 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from typing import List
+import bisect
+from typing import List, Tuple
 from patrickstar.core.comm import CommInfo
 
 import torch
@@ -53,6 +54,9 @@ class ChunkTensorIndex(object):
         self.tensor_id_to_info_map: dict[int, TensorInfo] = {}
         # 1-N dict, chunk_id -> List(tensor_id) in order of start_offset
         self.chunk_id_to_tensor_id_list_map: dict[int, List[int]] = {}
+        # 1-N dict, chunk_id -> List((start_offset, end_offset)) of the occupied
+        # intervals, aligned with `chunk_id_to_tensor_id_list_map`.
+        self.chunk_id_to_interval_list_map: dict[int, List[Tuple[int, int]]] = {}
 
         # comm_group -> chunk_id_list
         self.comm_group_to_chunk_id_list_map = {}
@@ -175,11 +179,12 @@ class ChunkTensorIndex(object):
         TODO(zilinzhu) This method is only called by `append_dummy_chunk`.
         Remove it in the future?
         """
-        if chunk_id not in self.chunk_id_to_tensor_id_list_map:
-            self.chunk_id_to_tensor_id_list_map[chunk_id] = list()
-
-        tensor_id_list = self.chunk_id_to_tensor_id_list_map[chunk_id]
-        tensor_id_list.append(tensor_id)
+        tensor_id_list = self._get_tensor_id_list(chunk_id)
+        interval_list = self._get_interval_list(chunk_id)
+        interval = (start_offset, start_offset + numel)
+        idx = bisect.bisect_right(interval_list, interval)
+        interval_list.insert(idx, interval)
+        tensor_id_list.insert(idx, tensor_id)
         if not is_param_registered(param):
             param_name = None
         else:
@@ -216,6 +221,11 @@ class ChunkTensorIndex(object):
             self.chunk_id_to_tensor_id_list_map[chunk_id] = list()
         return self.chunk_id_to_tensor_id_list_map[chunk_id]
 
+    def _get_interval_list(self, chunk_id):
+        if chunk_id not in self.chunk_id_to_interval_list_map:
+            self.chunk_id_to_interval_list_map[chunk_id] = list()
+        return self.chunk_id_to_interval_list_map[chunk_id]
+
     def params_generator(self, chunk_id):
         for tensor_id in self.chunk_id_to_tensor_id_list_map[chunk_id]:
             yield self.tensor_id_to_info_map[tensor_id].param
@@ -230,11 +240,14 @@ class ChunkTensorIndex(object):
         """
         assert is_param_registered(param)
         target_tensor_id = param.ps_attr.get_tensor_id(access_type)
-        if target_tensor_id not in self.tensor_id_to_info_map:
+        info = self.tensor_id_to_info_map.get(target_tensor_id)
+        if info is None or info.chunk_id != chunk_id:
             return
         self.tensor_id_to_info_map.pop(target_tensor_id)
         tensor_id_list = self._get_tensor_id_list(chunk_id)
-        tensor_id_list.remove(target_tensor_id)
+        idx = tensor_id_list.index(target_tensor_id)
+        tensor_id_list.pop(idx)
+        self._get_interval_list(chunk_id).pop(idx)
 
     def try_insert_tensor_list(self, chunk_id, param_list, access_type):
         r"""Insert a list of param to chunk.
@@ -275,46 +288,41 @@ class ChunkTensorIndex(object):
         Returns:
             Whether the insertion was successful.
         """
-        tensor_id_list = self._get_tensor_id_list(chunk_id)
-        prev_end_pos = 0
         assert is_param_registered(param)
-        numel = param.ps_attr.numel
-        tensor_name = param.ps_attr.name
         target_tensor_id = param.ps_attr.get_tensor_id(access_type)
-        for idx, tensor_id in enumerate(tensor_id_list):
-            if target_tensor_id == tensor_id:
-                return True
-        for idx, tensor_id in enumerate(tensor_id_list):
-            tensor_info = self.tensor_id_to_info_map[tensor_id]
-            start_pos = tensor_info.start_offset
-            gap = start_pos - prev_end_pos
-            if gap >= numel:
-                self.tensor_id_to_info_map[target_tensor_id] = TensorInfo(
-                    chunk_id,
-                    target_tensor_id,
-                    prev_end_pos,
-                    numel,
-                    param,
-                    access_type,
-                    tensor_name,
-                )
-                tensor_id_list.insert(idx + 1, target_tensor_id)
-                return True
-            prev_end_pos = start_pos + tensor_info.numel
-
-        logger.debug(
-            f"default_chunk_size {self.default_chunk_size}, prev_end_pos {prev_end_pos}, numel {numel}"
-        )
-        if self.default_chunk_size - prev_end_pos >= numel:
-            self.tensor_id_to_info_map[target_tensor_id] = TensorInfo(
-                chunk_id,
-                target_tensor_id,
-                prev_end_pos,
-                numel,
-                param,
-                access_type,
-                tensor_name,
-            )
-            tensor_id_list.insert(len(tensor_id_list), target_tensor_id)
+        info = self.tensor_id_to_info_map.get(target_tensor_id)
+        if info is not None and info.chunk_id == chunk_id:
             return True
-        return False
+
+        numel = param.ps_attr.numel
+        interval_list = self._get_interval_list(chunk_id)
+        # First fit. The intervals are sorted by start offset, so the gaps
+        # can be found with one pass over plain tuples.
+        insert_idx = None
+        prev_end_pos = 0
+        for idx, (start_pos, end_pos) in enumerate(interval_list):
+            if start_pos - prev_end_pos >= numel:
+                insert_idx = idx
+                break
+            prev_end_pos = end_pos
+
+        if insert_idx is None:
+            logger.debug(
+                f"default_chunk_size {self.default_chunk_size}, prev_end_pos {prev_end_pos}, numel {numel}"
+            )
+            if self.default_chunk_size - prev_end_pos < numel:
+                return False
+            insert_idx = len(interval_list)
+
+        self.tensor_id_to_info_map[target_tensor_id] = TensorInfo(
+            chunk_id,
+            target_tensor_id,
+            prev_end_pos,
+            numel,
+            param,
+            access_type,
+            param.ps_attr.name,
+        )
+        interval_list.insert(insert_idx, (prev_end_pos, prev_end_pos + numel))
+        self._get_tensor_id_list(chunk_id).insert(insert_idx, target_tensor_id)
+        return True
@@ -40,6 +40,19 @@ from .const import AccessType, ChunkState, TensorState, TrainingStage
 from .hook import setup_patrickstar_hooks
 from .parameter import register_param, is_param_registered, ParamType
 
+# Empty tensors used as `param.data` of released params, keyed by
+# (dtype, device). Nothing reads or writes them, so they can be shared.
+_empty_tensors = {}
+
+
+def _get_empty_tensor(dtype: torch.dtype, device: torch.device) -> torch.Tensor:
+    key = (dtype, device)
+    tensor = _empty_tensors.get(key)
+    if tensor is None:
+        tensor = torch.tensor([], dtype=dtype, device=device)
+        _empty_tensors[key] = tensor
+    return tensor
+
 
 class PatrickStarClient(object):
     r"""The client for managing chunks."""
@@ -66,6 +79,9 @@ class PatrickStarClient(object):
         self.torch_param_list = []
         self.param_fp16_to_param_fp32_map = {}
         self.chunk_based_param_fp16 = []
+        # registered param -> (is_dummy, is_local, is_chunk_based, param_fp32),
+        # see `get_param_info`.
+        self._param_info_cache = {}
 
         # for post backward hook
         self.grad_accs = []
@@ -222,12 +238,49 @@ class PatrickStarClient(object):
         And this method has nothing to do with whether the payload of
         the chunk is allocated or not.
         """
+        chunk = self.chunk_list[chunk_id]
         for info in self.chunk_tensor_index.generate_tensor_info_in_order(chunk_id):
-            param = info.param
-            access_type = info.access_type
-            old_state = param.ps_attr.get_state(access_type)
-            self.chunk_list.update_state(chunk_id, old_state, new_state)
-            param.ps_attr.set_state(new_state, access_type)
+            old_state = info.state()
+            if old_state != new_state:
+                chunk.update_state(old_state, new_state)
+            info.set_state(new_state)
+
+    def get_param_info(self, param):
+        r"""The info of `param` needed to save or load it.
+
+        The info is computed on the first call and cached, so it should only
+        be queried after the model is initialized, when params are no longer
+        registered or assigned to chunks.
+
+        Args:
+            param: :class:`torch.Tensor`.
+        Returns:
+            None if `param` is not a registered param. Otherwise a tuple of
+            (is_dummy, is_local, is_chunk_based, param_fp32), where `param_fp32`
+            is the fp32 copy of a local chunk based param and None otherwise.
+        """
+        # NOTE() Only the registered params are cached. Buffers and other
+        # tensors may be replaced by every load, caching them would keep them
+        # alive through the keys of the cache.
+        if not isinstance(param, torch.nn.Parameter) or not is_param_registered(param):
+            return None
+        info = self._param_info_cache.get(param)
+        if info is not None:
+            return info
+        ps_attr = param.ps_attr
+        is_dummy = ps_attr.name == "embedding_dummy" or ps_attr.name.startswith(
+            "dummy_"
+        )
+        is_local = ps_attr.is_local()
+        is_chunk_based = ps_attr.param_type == ParamType.CHUNK_BASED
+        param_fp32 = (
+            self.param_fp16_to_param_fp32_map.get(param)
+            if is_local and is_chunk_based
+            else None
+        )
+        info = (is_dummy, is_local, is_chunk_based, param_fp32)
+        self._param_info_cache[param] = info
+        return info
 
     def register_model_hook(self, model):
         setup_patrickstar_hooks(model, self)
@@ -338,8 +391,12 @@ class PatrickStarClient(object):
         # The state of chunk should be determined by the state of its tensors.
         old_state = param.ps_attr.get_state(access_type)
 
-        # If the old state was FREE, we need to fill the param to zero.
-        if old_state == TensorState.FREE:
+        # If the old state was FREE, we need to fill the param to zero,
+        # unless its memory is still zero since the payload was allocated.
+        if (
+            old_state == TensorState.FREE
+            and not self.chunk_list[chunk_id].free_tensors_zeroed()
+        ):
             param.ps_attr.access_tensor(access_type).zero_()
 
         # Change the state of param to COMPUTE.
@@ -547,9 +604,7 @@ class PatrickStarClient(object):
         if access_type == AccessType.DATA:
             # NOTE(jiaruifang) device must be the same as the origin param.
             # Or it will affect hook of param.grad_fn.next_functions[0][0].
-            param.data = torch.tensor(
-                [], dtype=param.ps_attr.data_type, device=param.device
-            )
+            param.data = _get_empty_tensor(param.ps_attr.data_type, param.device)
         elif access_type == AccessType.GRAD:
             param.grad = None
 
@@ -664,9 +719,7 @@ class PatrickStarClient(object):
         if access_type == AccessType.DATA:
             # NOTE(jiaruifang) device must be the same as the origin param.
             # Or it will affect hook of param.grad_fn.next_functions[0][0].
-            param.data = torch.tensor(
-                [], dtype=param.ps_attr.data_type, device=param.device
-            )
+            param.data = _get_empty_tensor(param.ps_attr.data_type, param.device)
         elif access_type == AccessType.GRAD:
             param.grad = None
 
@@ -33,6 +33,8 @@ from .const import TensorState, AccessType, ParamType
 
 
 class PSTensor(object):
+    __slots__ = ("tensor", "id", "state")
+
     global_id = 0
 
     def __init__(self):
@@ -41,7 +41,7 @@ _orig_torch_empty = torch.empty
 
 
 def empty_cpu_tensor_half(*size, **kwargs):
-    if "device" not in kwargs.keys():
+    if "device" not in kwargs:
         kwargs["device"] = torch.device("cpu:0")
     tensor = _orig_torch_empty(*size, **kwargs)
     if tensor.is_floating_point():
@@ -63,7 +63,7 @@ def new_cpu_tensor_half(cls, *args):
 
 
 def empty_cpu_tensor(*size, **kwargs):
-    if "device" not in kwargs.keys():
+    if "device" not in kwargs:
         kwargs["device"] = torch.device("cpu:0")
     tensor = _orig_torch_empty(*size, **kwargs)
     return tensor
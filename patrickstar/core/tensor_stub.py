@@ -29,12 +29,24 @@
 
 import torch
 
-from patrickstar.core.const import AccessType, ParamType
+from patrickstar.core.const import AccessType, ParamType, TensorState
+from patrickstar.core.parameter import is_param_registered
 
 
 class TensorInfo(object):
     r"""The info related to certain tensor."""
 
+    __slots__ = (
+        "tensor_id",
+        "chunk_id",
+        "start_offset",
+        "numel",
+        "param",
+        "tensor_name",
+        "access_type",
+        "_ps_tensor",
+    )
+
     def __init__(
         self,
         chunk_id: int,
@@ -56,6 +68,15 @@ class TensorInfo(object):
             else f"{param_name}.grad"
         )
         self.access_type = access_type
+        # Cache the PSTensor holding the state, so that `state()` does not
+        # need to dispatch on param type and access type every time.
+        if (
+            is_param_registered(param)
+            and param.ps_attr.param_type == ParamType.CHUNK_BASED
+        ):
+            self._ps_tensor = param.ps_attr._access_ps_tensor(access_type)
+        else:
+            self._ps_tensor = None
 
     def __str__(self):
         return (
@@ -65,7 +86,15 @@ class TensorInfo(object):
         )
 
     def state(self):
-        if self.param.ps_attr.param_type == ParamType.TORCH_BASED:
+        if self._ps_tensor is None:
             return None
-        else:
-            return self.param.ps_attr.get_state(self.access_type)
+        return self._ps_tensor.state
+
+    def set_state(self, state: TensorState):
+        r"""Same as `PSParameter.set_state`, but without dispatching on the
+        access type, which is already known to the info.
+        """
+        ps_tensor = self._ps_tensor
+        ps_tensor.state = state
+        if state != TensorState.COMPUTE:
+            ps_tensor.tensor = None
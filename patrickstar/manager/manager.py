@@ -144,6 +144,9 @@ class PatrickStarManager(metaclass=SingletonMeta):
     def is_nonwarmup_training(self):
         return self._start_training and not self.is_warmup
 
+    def get_training_stage(self):
+        return self._training_stage
+
     def set_training_stage(self, training_stage: TrainingStage):
         if profiler.started():
             profiler.stage_convert_time.append((time.time(), training_stage))
@@ -281,6 +284,25 @@ class PatrickStarManager(metaclass=SingletonMeta):
         else:
             raise f"device type {device_type} is not supported"
 
+    def transfer(self, src_device_type: str, dst_device_type: str, size_in_bytes: int):
+        r"""Account for `size_in_bytes` of chunk memory moved between devices.
+
+        Same as `delete` on `src_device_type` followed by `add` on
+        `dst_device_type`, done in one call for chunk moves.
+        """
+        if src_device_type == dst_device_type:
+            return
+        if src_device_type == "cpu" and dst_device_type == "cuda":
+            self.cpu_chunk_used_mem -= size_in_bytes
+            self.gpu_chunk_used_mem += size_in_bytes
+        elif src_device_type == "cuda" and dst_device_type == "cpu":
+            self.gpu_chunk_used_mem -= size_in_bytes
+            self.cpu_chunk_used_mem += size_in_bytes
+        else:
+            raise RuntimeError(
+                f"transfer from {src_device_type} to {dst_device_type} is not supported"
+            )
+
     def free_chunk_mem(self, device_type):
         size = self.available_chunk_mem(device_type) - self.used_chunk_mem(device_type)
         logger.debug(
@@ -92,6 +92,8 @@ class FP16ChunkWriteBuffer(object):
             self.cached_src_chunk_id is not None
             and src_info.chunk_id != self.cached_src_chunk_id
         ):
+            self.chunk_list[self.cached_src_chunk_id].wait_copy()
+            self.chunk_list[self.cached_target_chunk_id].wait_copy()
             # TODO(jiaruifang) Optimize CPU -> GPU copy.
             target_device = self.chunk_list[self.cached_target_chunk_id].payload.device
             src_device = self.chunk_list[self.cached_src_chunk_id].payload.device
@@ -127,6 +129,8 @@ class FP16ChunkWriteBuffer(object):
         # It's possible that the chunk is empty (no payload), e.g. the process only possesses
         # a large torch based embedding layer.
         if self.chunk_list[self.cached_src_chunk_id] is not None:
+            self.chunk_list[self.cached_src_chunk_id].wait_copy()
+            self.chunk_list[self.cached_target_chunk_id].wait_copy()
             self.chunk_list[self.cached_target_chunk_id].payload.copy_(
                 self.chunk_list[self.cached_src_chunk_id].payload
             )
@@ -206,7 +210,9 @@ class FP32ChunkReadBuffer(object):
                 else:
                     target_device = torch.device("cpu:0")
 
-                chunk_payload = self.chunk_list[info.chunk_id].payload
+                chunk = self.chunk_list[info.chunk_id]
+                chunk.wait_copy()
+                chunk_payload = chunk.payload
                 if target_device.type == "cuda":
                     self.gpu_payload.copy_(chunk_payload)
                     self.ret_payload = self.gpu_payload
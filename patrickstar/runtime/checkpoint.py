@@ -28,31 +28,64 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from collections import OrderedDict
-import itertools
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
 
 import torch
 
-from patrickstar.core import is_param_registered, ParamType
+from patrickstar.core import TensorState, TrainingStage
+from patrickstar.manager import PatrickStarManager
 from patrickstar.utils import logger
 
+# The max number of threads copying the params of a chunk in `state_dict`.
+_STATE_DICT_COPY_THREADS = 8
+# Only the params with at least this many elements are copied by the threads,
+# the smaller ones are copied inline. A conservative default: dispatching a
+# clone to a thread only pays off from about 256K elements.
+_STATE_DICT_THREAD_COPY_NUMEL = 1 << 20
+# The number of elements copied at a time when loading a param into the fp16
+# and fp32 chunks. 512KB of fp32, which stays in the L2 cache.
+_LOAD_COPY_TILE_NUMEL = 1 << 17
 
-def state_dict(module, client, destination=None, prefix="", keep_vars=False):
+
+def _collect_state_dict(
+    module,
+    client,
+    destination,
+    prefix,
+    keep_vars,
+    fp16,
+    chunk_to_param_list,
+    hook_list,
+):
     def _save_to_state_dict(module, destination, prefix, keep_vars):
         for name, param in module._parameters.items():
             if param is not None:
-                if is_param_registered(param):
-                    attr_name = param.ps_attr.name
-                    if attr_name == "embedding_dummy" or attr_name.startswith("dummy_"):
+                param_info = client.get_param_info(param)
+                if param_info is not None:
+                    is_dummy, is_local, is_chunk_based, param_fp32 = param_info
+                    if is_dummy:
                         continue
-                    elif param.ps_attr.is_local():
-                        if param.ps_attr.param_type == ParamType.CHUNK_BASED:
-                            param_fp32 = client.param_fp16_to_param_fp32_map[param]
-                            ps_data_fp32 = client.access_data(
-                                param_fp32, torch.device("cpu:0")
+                    elif is_local:
+                        if is_chunk_based:
+                            # Filled chunk by chunk in `state_dict`, keep the
+                            # place of the key in the ordered dict for now.
+                            chunk_param = param if fp16 else param_fp32
+                            info = client.chunk_tensor_index.get_tensor_info(
+                                chunk_param.ps_attr.data_id()
                             )
-                            destination[prefix + name] = (
-                                ps_data_fp32 if keep_vars else ps_data_fp32.detach()
+                            if info.chunk_id not in chunk_to_param_list:
+                                chunk_to_param_list[info.chunk_id] = []
+                            chunk_to_param_list[info.chunk_id].append(
+                                (prefix + name, info, chunk_param.ps_attr.shape)
                             )
+                            destination[prefix + name] = None
                         else:
                             destination[prefix + name] = (
                                 param if keep_vars else param.detach()
@@ -67,22 +100,377 @@ def state_dict(module, client, destination=None, prefix="", keep_vars=False):
             if buf is not None and name not in module._non_persistent_buffers_set:
                 destination[prefix + name] = buf if keep_vars else buf.detach()
 
+    # The modules are visited in the same order as a recursive walk: the params
+    # and buffers of a module, then its children, then its hooks, which are
+    # pushed as a marker below the children. The hooks are only recorded in
+    # `hook_list`, they are run by `_run_state_dict_hooks` once the chunk based
+    # params are filled.
+    stack = [(module, prefix, False)]
+    while stack:
+        module, prefix, run_hooks = stack.pop()
+        if run_hooks:
+            if module._state_dict_hooks:
+                hook_list.append((module, prefix))
+            continue
+        destination._metadata[prefix[:-1]] = dict(version=module._version)
+        _save_to_state_dict(module, destination, prefix, keep_vars)
+        stack.append((module, prefix, True))
+        for name, child in reversed(list(module._modules.items())):
+            if child is not None:
+                stack.append((child, prefix + name + ".", False))
+    return destination
+
+
+def _run_state_dict_hooks(root_module, destination, hook_list):
+    r"""Run the state dict hooks recorded by `_collect_state_dict` in order.
+
+    Returns:
+        The state dict, which may be replaced by the hooks of `root_module`.
+    """
+    # TODO(zilinzhu): Figure out when we will use these hooks.
+    for module, prefix in hook_list:
+        local_metadata = destination._metadata[prefix[:-1]]
+        for hook in module._state_dict_hooks.values():
+            hook_result = hook(module, destination, prefix, local_metadata)
+            # Like `torch.nn.Module.state_dict`, only the result of the hooks
+            # of the root module replaces the state dict.
+            if hook_result is not None and module is root_module:
+                destination = hook_result
+    return destination
+
+
+def _access_chunk_payload(client, chunk_id, compute_device):
+    r"""Make the payload of the chunk available on `compute_device` and return it.
+
+    Unlike `client.access`, the states of the tensors in the chunk are not changed.
+    """
+    client.chunk_list.access_chunk(chunk_id, compute_device)
+    return client.chunk_list[chunk_id].payload
+
+
+def _read_chunk_payload(client, chunk_id, cpu_device):
+    r"""Get the content of the payload of the chunk on CPU, for reading only.
+
+    The payload of a chunk on GPU is copied to a pinned buffer of the chunk
+    list, instead of moving the chunk to CPU, which may move other chunks
+    to make room and has to be undone for training.
+
+    Returns:
+        A tuple of the CPU tensor and whether it is a pinned buffer to be
+        returned with `client.chunk_list.release_pinned`.
+    """
+    chunk = client.chunk_list[chunk_id]
+    device = chunk.get_device()
+    if device is None or device.type != "cuda":
+        return _access_chunk_payload(client, chunk_id, cpu_device), False
+    chunk.wait_copy()
+    staging = client.chunk_list.acquire_pinned(chunk.capacity, chunk.data_type)
+    staging.copy_(chunk.payload)
+    return staging, True
+
+
+def state_dict(
+    module, client, destination=None, prefix="", keep_vars=False, fp16=False
+):
+    r"""The state dict of `module`, with the fp32 or fp16 copy of the chunk based params.
+
+    The chunk based params are read chunk by chunk: every chunk is read
+    once, and all its params are taken from the payload. Chunks are not
+    moved, the ones on GPU are copied through a pinned buffer.
+
+    Args:
+        module: :class:`torch.nn.Module`.
+        client: :class:`PatrickStarClient`.
+        destination: :class:`OrderedDict`.
+        prefix: str.
+        keep_vars: bool. If True, the chunk based params in chunks on CPU are
+            views of the chunk payload, which alias the chunk memory and are only
+            valid until the chunk is moved or released. The ones in chunks on GPU
+            are still copied to CPU.
+        fp16: bool. Save the fp16 copy of the chunk based params instead of the
+            fp32 one, which halves their size. The fp32 copy is cast from it
+            when loading, so the precision of the fp32 copy is lost.
+            The fp16 chunks hold the grads from backward to the optimizer step,
+            so this raises a RuntimeError during BWD.
+    Returns:
+        :class:`OrderedDict`.
+    """
+    destination, _ = _state_dict(module, client, destination, prefix, keep_vars, fp16)
+    return destination
+
+
+def _state_dict(module, client, destination, prefix, keep_vars, fp16):
+    r"""Same as `state_dict`, also returns the chunk based params read from chunks.
+
+    Returns:
+        A tuple of the state dict and a dict of chunk_id -> list of (key, tensor
+        info, shape) of the chunk based params.
+    """
+    # NOTE() The post backward hooks copy the grads into the fp16 chunks, which
+    # only hold the params again after the optimizer step.
+    if fp16 and PatrickStarManager().get_training_stage() == TrainingStage.BWD:
+        raise RuntimeError(
+            "The fp16 chunks hold grads between backward and the optimizer step, "
+            "call state_dict(fp16=True) after the optimizer step instead."
+        )
     if destination is None:
         destination = OrderedDict()
         destination._metadata = OrderedDict()
-    destination._metadata[prefix[:-1]] = local_metadata = dict(version=module._version)
-    _save_to_state_dict(module, destination, prefix, keep_vars)
-    for name, module in module._modules.items():
-        if module is not None:
-            state_dict(
-                module, client, destination, prefix + name + ".", keep_vars=keep_vars
+    # chunk_id -> list of (key, tensor info, shape) of the local chunk based params.
+    # The chunks are read in the order of their ids, which is the order they are
+    # laid out and usually moved in, instead of the order of the modules.
+    chunk_to_param_list = {}
+    # list of (module, prefix) of the modules with state dict hooks.
+    hook_list = []
+    destination = _collect_state_dict(
+        module,
+        client,
+        destination,
+        prefix,
+        keep_vars,
+        fp16,
+        chunk_to_param_list,
+        hook_list,
+    )
+
+    cpu_device = torch.device("cpu:0")
+    chunk_items = sorted(chunk_to_param_list.items())
+    if keep_vars:
+        # Return views of the payloads on CPU without copying them. The chunks
+        # on GPU are copied below, so that all the params are on CPU.
+        copy_items = []
+        for chunk_id, param_list in chunk_items:
+            chunk = client.chunk_list[chunk_id]
+            device = chunk.get_device()
+            if device is not None and device.type == "cuda":
+                copy_items.append((chunk_id, param_list))
+                continue
+            if chunk.payload is None:
+                payload = _access_chunk_payload(client, chunk_id, cpu_device)
+            else:
+                chunk.wait_copy()
+                payload = chunk.payload
+            for key, info, shape in param_list:
+                destination[key] = payload.narrow(
+                    0, info.start_offset, info.numel
+                ).view(shape)
+        chunk_items = copy_items
+
+    # The chunks are accessed one at a time, as the chunk list is not thread
+    # safe, while the large params in a chunk are copied in parallel. The
+    # copies release the GIL.
+    num_workers = min(_STATE_DICT_COPY_THREADS, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for chunk_id, param_list in chunk_items:
+            payload, is_staging = _read_chunk_payload(client, chunk_id, cpu_device)
+            futures = []
+            for key, info, shape in param_list:
+                tensor = payload.narrow(0, info.start_offset, info.numel).view(shape)
+                if info.numel >= _STATE_DICT_THREAD_COPY_NUMEL:
+                    futures.append((key, executor.submit(tensor.clone)))
+                else:
+                    destination[key] = tensor.clone()
+            for key, future in futures:
+                destination[key] = future.result()
+            if is_staging:
+                client.chunk_list.release_pinned(payload)
+    destination = _run_state_dict_hooks(module, destination, hook_list)
+    return destination, chunk_to_param_list
+
+
+def _import_safetensors():
+    try:
+        import safetensors.torch
+    except ImportError:
+        raise RuntimeError(
+            "Saving or loading .safetensors checkpoints requires safetensors, "
+            "please install it with `pip install safetensors`."
+        )
+    return safetensors
+
+
+def _snapshot_state_dict(module, client, fp16):
+    r"""The state dict of `module` as CPU tensors not shared with the model.
+
+    The chunk based params are already copied from the chunks by `state_dict`,
+    only the other params and buffers are copied here.
+
+    Returns:
+        A tuple of a dict of key -> tensor and the safetensors metadata.
+    """
+    destination, chunk_to_param_list = _state_dict(
+        module, client, None, "", False, fp16
+    )
+    chunk_keys = set()
+    for param_list in chunk_to_param_list.values():
+        for key, _, _ in param_list:
+            chunk_keys.add(key)
+    tensors = {}
+    for key, tensor in destination.items():
+        if key in chunk_keys:
+            tensors[key] = tensor
+        else:
+            # safetensors refuses tensors sharing memory, e.g. tied weights.
+            tensors[key] = tensor.detach().to("cpu", copy=True).contiguous()
+    metadata = {"_metadata": json.dumps(getattr(destination, "_metadata", {}))}
+    return tensors, metadata
+
+
+def save_state_dict(module, client, path, fp16=False):
+    r"""Save the state dict of `module` to `path` in the safetensors format.
+
+    The tensors are written as raw bytes after a small JSON header, instead of
+    being pickled by `torch.save`. The `_metadata` of the state dict is kept in
+    the header. The file can be loaded with `load_state_dict`.
+
+    Args:
+        module: :class:`torch.nn.Module`.
+        client: :class:`PatrickStarClient`.
+        path: str or :class:`os.PathLike`.
+        fp16: bool. Save the fp16 copy of the chunk based params, see `state_dict`.
+    """
+    safetensors = _import_safetensors()
+    tensors, metadata = _snapshot_state_dict(module, client, fp16)
+    safetensors.torch.save_file(tensors, path, metadata=metadata)
+
+
+# The thread writing the checkpoint of `save_state_dict_async`, and the
+# exception it raised if any.
+_save_thread = None
+_save_error = None
+
+
+def save_state_dict_async(module, client, path, fp16=False):
+    r"""Same as `save_state_dict`, but the file is written by a background thread.
+
+    The state dict is copied to CPU before returning, so training can go on
+    while the file is written. Call `wait_for_save` before reading the file.
+    A pending save is waited for first, so at most one snapshot is in memory.
+
+    Args:
+        module: :class:`torch.nn.Module`.
+        client: :class:`PatrickStarClient`.
+        path: str or :class:`os.PathLike`.
+        fp16: bool. Save the fp16 copy of the chunk based params, see `state_dict`.
+    """
+    global _save_thread
+    safetensors = _import_safetensors()
+    wait_for_save()
+    tensors, metadata = _snapshot_state_dict(module, client, fp16)
+
+    def _write():
+        global _save_error
+        try:
+            safetensors.torch.save_file(tensors, path, metadata=metadata)
+        except Exception as ex:
+            _save_error = ex
+        finally:
+            # Free the snapshot as soon as it is written.
+            tensors.clear()
+
+    _save_thread = threading.Thread(target=_write, name="patrickstar-save")
+    _save_thread.start()
+
+
+def wait_for_save():
+    r"""Wait for the file of the last `save_state_dict_async` to be written.
+
+    Raises the exception of the writing thread, if any.
+    """
+    global _save_thread, _save_error
+    if _save_thread is not None:
+        _save_thread.join()
+        _save_thread = None
+    if _save_error is not None:
+        ex, _save_error = _save_error, None
+        raise ex
+
+
+def _load_safetensors(path):
+    safetensors = _import_safetensors()
+    loaded = OrderedDict()
+    with safetensors.safe_open(path, framework="pt", device="cpu") as f:
+        metadata = f.metadata()
+        for key in f.keys():
+            loaded[key] = f.get_tensor(key)
+    if metadata is not None and "_metadata" in metadata:
+        loaded._metadata = OrderedDict(json.loads(metadata["_metadata"]))
+    return loaded
+
+
+# The kinds of params to load, see `_make_load_handlers`.
+_TORCH_PARAM = 0
+_LOCAL_CHUNK_PARAM = 1
+_REMOTE_CHUNK_PARAM = 2
+
+
+def _make_load_handlers(
+    client, state_dict, error_msgs, chunk_to_load_list, release_loaded
+):
+    r"""Make the functions loading each kind of param from `state_dict`.
+
+    The state shared by all params of a load is bound once, so that
+    `_load_from_state_dict` only picks the function of the kind of the param.
+
+    Returns:
+        A tuple of functions indexed by `_TORCH_PARAM`, `_LOCAL_CHUNK_PARAM`
+        and `_REMOTE_CHUNK_PARAM`, called as `handler(key, param, param_info,
+        input_param)`.
+    """
+
+    def _load_torch_param(key, param, param_info, input_param):
+        if input_param.shape != param.shape:
+            # local shape should match the one in checkpoint
+            error_msgs.append(
+                "size mismatch for {}: copying a param with shape {} from checkpoint, "
+                "the shape in current model is {}.".format(
+                    key, input_param.shape, param.shape
+                )
             )
-    # TODO(zilinzhu): Figure out when we will use these hooks.
-    for hook in module._state_dict_hooks.values():
-        hook_result = hook(module, destination, prefix, local_metadata)
-        if hook_result is not None:
-            destination = hook_result
-    return destination
+            return
+        try:
+            with torch.no_grad():
+                param.copy_(input_param)
+        except MemoryError as ex:
+            error_msgs.append(
+                'While copying the parameter named "{}", '
+                "whose dimensions in the model are {} and "
+                "whose dimensions in the checkpoint are {}, "
+                "an exception occurred : {}.".format(
+                    key, param.size(), input_param.size(), ex.args
+                )
+            )
+            return
+        if release_loaded:
+            del state_dict[key]
+
+    def _load_local_chunk_param(key, param, param_info, input_param):
+        param_fp32 = param_info[3]
+        shape = param.ps_attr.shape
+        if input_param.shape != shape:
+            # local shape should match the one in checkpoint
+            error_msgs.append(
+                "size mismatch for {}: copying a param with shape {} from checkpoint, "
+                "the shape in current model is {}.".format(
+                    key, input_param.shape, shape
+                )
+            )
+            return
+        # Copied chunk by chunk in `_load_chunks`.
+        info_fp16 = client.chunk_tensor_index.get_tensor_info(param.ps_attr.data_id())
+        info_fp32 = client.chunk_tensor_index.get_tensor_info(
+            param_fp32.ps_attr.data_id()
+        )
+        chunk_key = (info_fp16.chunk_id, info_fp32.chunk_id)
+        if chunk_key not in chunk_to_load_list:
+            chunk_to_load_list[chunk_key] = []
+        chunk_to_load_list[chunk_key].append((key, shape, info_fp16, info_fp32))
+
+    def _skip_remote_chunk_param(key, param, param_info, input_param):
+        # Remote params are loaded by the process owning them.
+        pass
+
+    return (_load_torch_param, _load_local_chunk_param, _skip_remote_chunk_param)
 
 
 def _load_from_state_dict(
@@ -95,6 +483,8 @@ def _load_from_state_dict(
     missing_keys,
     unexpected_keys,
     error_msgs,
+    load_handlers,
+    keys_by_prefix,
 ):
     # TODO(zilinzhu): Figure out when we will use these hooks.
     for hook in module._load_state_dict_pre_hooks.values():
@@ -108,112 +498,230 @@ def _load_from_state_dict(
             error_msgs,
         )
 
-    persistent_buffers = {
-        k: v
-        for k, v in module._buffers.items()
-        if k not in module._non_persistent_buffers_set
-    }
-    local_name_params = itertools.chain(
-        module._parameters.items(), persistent_buffers.items()
-    )
-    local_state = {k: v for k, v in local_name_params if v is not None}
+    local_state = {}
+    for k, v in module._parameters.items():
+        if v is not None:
+            local_state[k] = v
+    non_persistent_buffers = module._non_persistent_buffers_set
+    for k, v in module._buffers.items():
+        if v is not None and k not in non_persistent_buffers:
+            local_state[k] = v
 
     for name, param in local_state.items():
         key = prefix + name
         if key in state_dict:
-            input_param = state_dict[key]
-
-            if (
-                isinstance(param, torch.nn.Parameter)
-                and is_param_registered(param)
-                and param.ps_attr.param_type == ParamType.CHUNK_BASED
-            ):
-                if param.ps_attr.is_local():
-                    param_fp32 = client.param_fp16_to_param_fp32_map[param]
-                    ps_data_fp16 = client.access_data(param, torch.device("cpu:0"))
-                    ps_data_fp32 = client.access_data(param_fp32, torch.device("cpu:0"))
-                    assert ps_data_fp16.shape == ps_data_fp32.shape
-
-                    if input_param.shape != ps_data_fp16.shape:
-                        # local shape should match the one in checkpoint
-                        error_msgs.append(
-                            "size mismatch for {}: copying a param with shape {} from checkpoint, "
-                            "the shape in current model is {}.".format(
-                                key, input_param.shape, ps_data_fp16.shape
-                            )
-                        )
-                        continue
-                    try:
-                        with torch.no_grad():
-                            ps_data_fp16.copy_(input_param)
-                            ps_data_fp32.copy_(input_param)
-                    except MemoryError as ex:
-                        error_msgs.append(
-                            'While copying the parameter named "{}", '
-                            "whose dimensions in the model are {} and "
-                            "whose dimensions in the checkpoint are {}, "
-                            "an exception occurred : {}.".format(
-                                key, ps_data_fp16.size(), input_param.size(), ex.args
-                            )
-                        )
-                else:
-                    # Skip remote params.
-                    continue
+            param_info = client.get_param_info(param)
+            if param_info is None or not param_info[2]:
+                handler = load_handlers[_TORCH_PARAM]
+            elif param_info[1]:
+                handler = load_handlers[_LOCAL_CHUNK_PARAM]
             else:
-                if input_param.shape != param.shape:
-                    # local shape should match the one in checkpoint
-                    error_msgs.append(
-                        "size mismatch for {}: copying a param with shape {} from checkpoint, "
-                        "the shape in current model is {}.".format(
-                            key, input_param.shape, param.shape
-                        )
-                    )
-                    continue
-                try:
-                    with torch.no_grad():
-                        param.copy_(input_param)
-                except MemoryError as ex:
-                    error_msgs.append(
-                        'While copying the parameter named "{}", '
-                        "whose dimensions in the model are {} and "
-                        "whose dimensions in the checkpoint are {}, "
-                        "an exception occurred : {}.".format(
-                            key, param.size(), input_param.size(), ex.args
-                        )
-                    )
+                handler = load_handlers[_REMOTE_CHUNK_PARAM]
+            handler(key, param, param_info, state_dict[key])
         elif strict:
             missing_keys.append(key)
 
     if strict:
-        for key in state_dict.keys():
-            if key.startswith(prefix):
-                input_name = key[len(prefix) :]
-                input_name = input_name.split(".", 1)[
-                    0
-                ]  # get the name of param/buffer/child
-                if input_name not in module._modules and input_name not in local_state:
-                    unexpected_keys.append(key)
+        # The keys under `prefix`, grouped by the name of param/buffer/child.
+        if keys_by_prefix is None:
+            keys_by_name = _group_keys_under_prefix(state_dict, prefix)
+        else:
+            keys_by_name = keys_by_prefix.get(prefix, {})
+        for input_name, key_list in keys_by_name.items():
+            if input_name not in module._modules and input_name not in local_state:
+                unexpected_keys.extend(key for key in key_list if key in state_dict)
 
 
-def load_state_dict(module, client, state_dict, strict=False):
-    missing_keys = []
-    unexpected_keys = []
-    error_msgs = []
+def _group_keys_under_prefix(state_dict, prefix):
+    r"""Group the keys of `state_dict` under `prefix` by their next name.
+
+    Same as `_group_keys_by_prefix(state_dict).get(prefix, {})`, for a single
+    prefix.
+    """
+    keys_by_name = {}
+    for key in state_dict.keys():
+        if key.startswith(prefix):
+            # get the name of param/buffer/child
+            input_name = key[len(prefix) :].split(".", 1)[0]
+            if input_name not in keys_by_name:
+                keys_by_name[input_name] = []
+            keys_by_name[input_name].append(key)
+    return keys_by_name
+
+
+def _group_keys_by_prefix(state_dict):
+    r"""Group the keys of `state_dict` by each of their module prefixes.
+
+    For example, "a.b.weight" is under "" with name "a", under "a." with name
+    "b" and under "a.b." with name "weight".
+
+    Returns:
+        dict of prefix -> dict of name -> list of keys.
+    """
+    keys_by_prefix = {}
+    for key in state_dict.keys():
+        prefix = ""
+        for name in key.split("."):
+            if prefix not in keys_by_prefix:
+                keys_by_prefix[prefix] = {}
+            if name not in keys_by_prefix[prefix]:
+                keys_by_prefix[prefix][name] = []
+            keys_by_prefix[prefix][name].append(key)
+            prefix = prefix + name + "."
+    return keys_by_prefix
+
+
+def _hold_if_free(client, info):
+    r"""Mark a FREE tensor whose memory was just written as HOLD.
+
+    Otherwise its memory would be zeroed when it is accessed.
+    """
+    if info.state() == TensorState.FREE:
+        client.chunk_list.update_state(
+            info.chunk_id, TensorState.FREE, TensorState.HOLD
+        )
+        info.set_state(TensorState.HOLD)
+
+
+def _tiled_copy(first_copy, second_copy, src, tile_numel=_LOAD_COPY_TILE_NUMEL):
+    r"""Copy `src` to `first_copy`, then `first_copy` to `second_copy`, by tiles.
+
+    Each tile of `first_copy` is still in cache when it is read for
+    `second_copy`, instead of going through memory twice for large params.
+    The tiles are whole rows of the leading dimension of `src`.
+
+    Args:
+        first_copy: :class:`torch.Tensor`. Contiguous, of the shape of `src`.
+        second_copy: :class:`torch.Tensor`. Contiguous, of the shape of `src`.
+        src: :class:`torch.Tensor`.
+        tile_numel: int. The number of elements of a tile.
+    """
+    numel = src.numel()
+    if numel <= tile_numel:
+        first_copy.copy_(src)
+        second_copy.copy_(first_copy)
+        return
+    # Tile over the leading dimension instead of flattening `src`, which would
+    # copy all of it at once when it is not contiguous. A tile has at least
+    # one row.
+    num_rows = src.size(0)
+    rows_per_tile = max(1, tile_numel // (numel // num_rows))
+    for start in range(0, num_rows, rows_per_tile):
+        length = min(rows_per_tile, num_rows - start)
+        first_tile = first_copy.narrow(0, start, length)
+        first_tile.copy_(src.narrow(0, start, length))
+        second_copy.narrow(0, start, length).copy_(first_tile)
+
+
+def _load_chunks(client, state_dict, chunk_to_load_list, error_msgs, release_loaded):
+    r"""Copy the chunk based params from `state_dict` chunk by chunk.
+
+    Every pair of fp16 and fp32 chunks is moved to CPU once, in the order of
+    the chunk ids, and the params are written to the payloads directly. If
+    `release_loaded` is True, the loaded keys are removed from `state_dict`.
+    """
+    cpu_device = torch.device("cpu:0")
+    for chunk_ids in sorted(chunk_to_load_list):
+        chunk_id_fp16, chunk_id_fp32 = chunk_ids
+        # Drop the group once visited, so that nothing from it outlives the
+        # copies of its chunks.
+        load_list = chunk_to_load_list.pop(chunk_ids)
+        chunk_fp16 = client.chunk_list[chunk_id_fp16]
+        payload_fp16 = _access_chunk_payload(client, chunk_id_fp16, cpu_device)
+        # Do not move out the fp16 chunk to make room for the fp32 one. Keep
+        # the pin of the caller, if any.
+        was_pinned = chunk_fp16.is_pin()
+        chunk_fp16.pin()
+        payload_fp32 = _access_chunk_payload(client, chunk_id_fp32, cpu_device)
+        if not was_pinned:
+            chunk_fp16.unpin()
+        for key, shape, info_fp16, info_fp32 in load_list:
+            input_param = state_dict[key]
+            ps_data_fp16 = payload_fp16.narrow(
+                0, info_fp16.start_offset, info_fp16.numel
+            ).view(shape)
+            ps_data_fp32 = payload_fp32.narrow(
+                0, info_fp32.start_offset, info_fp32.numel
+            ).view(shape)
+            # Read the checkpoint tensor only once, into the copy of the
+            # same dtype when there is one, and fill the other copy from it.
+            if input_param.dtype == torch.half:
+                first_copy, second_copy = ps_data_fp16, ps_data_fp32
+            else:
+                first_copy, second_copy = ps_data_fp32, ps_data_fp16
+            try:
+                with torch.no_grad():
+                    _tiled_copy(first_copy, second_copy, input_param)
+            except MemoryError as ex:
+                error_msgs.append(
+                    'While copying the parameter named "{}", '
+                    "whose dimensions in the model are {} and "
+                    "whose dimensions in the checkpoint are {}, "
+                    "an exception occurred : {}.".format(
+                        key, ps_data_fp16.size(), input_param.size(), ex.args
+                    )
+                )
+                continue
+            # NOTE() Do not keep the staged tensor alive until the next param,
+            # otherwise the last one of every chunk lingers during the
+            # access of the next pair of chunks.
+            del input_param, first_copy, second_copy
+            _hold_if_free(client, info_fp16)
+            _hold_if_free(client, info_fp32)
+            if release_loaded:
+                # Drop the loaded tensor so that its memory (or mapped pages)
+                # can be freed.
+                del state_dict[key]
+
+
+def _load_state_dict(
+    module, client, state_dict, mmap, missing_keys, unexpected_keys, error_msgs
+):
+    # Whether `state_dict` is only referenced here, so that the loaded tensors
+    # can be removed from it and freed as loading goes.
+    release_loaded = False
+    if isinstance(state_dict, (str, os.PathLike)):
+        if os.fspath(state_dict).endswith(".safetensors"):
+            state_dict = _load_safetensors(state_dict)
+        elif mmap:
+            state_dict = torch.load(state_dict, map_location="cpu", mmap=True)
+        else:
+            state_dict = torch.load(state_dict, map_location="cpu")
+        release_loaded = True
 
-    # copy state_dict so _load_from_state_dict can modify it
     metadata = getattr(state_dict, "_metadata", None)
-    state_dict = state_dict.copy()
-    if metadata is not None:
-        # mypy isn't aware that "_metadata" exists in state_dict
-        state_dict._metadata = metadata  # type: ignore[attr-defined]
+    has_pre_hooks = any(m._load_state_dict_pre_hooks for m in module.modules())
+    # The state dict of the caller is only read, unless a load pre hook may
+    # modify it. Only copy it in that case.
+    if not release_loaded and has_pre_hooks:
+        state_dict = state_dict.copy()
+        if metadata is not None:
+            # mypy isn't aware that "_metadata" exists in state_dict
+            state_dict._metadata = metadata  # type: ignore[attr-defined]
+        release_loaded = True
 
-    def load(module, prefix=""):
+    # (fp16 chunk_id, fp32 chunk_id) -> list of (key, shape, fp16 tensor info,
+    # fp32 tensor info) of the local chunk based params to load.
+    chunk_to_load_list = {}
+    load_handlers = _make_load_handlers(
+        client, state_dict, error_msgs, chunk_to_load_list, release_loaded
+    )
+    if has_pre_hooks:
+        # The load pre hooks may change the keys, they are grouped for each
+        # module after its hooks ran instead.
+        keys_by_prefix = None
+    else:
+        keys_by_prefix = _group_keys_by_prefix(state_dict)
+    # Visit the modules in the same order as a recursive walk.
+    stack = [(module, "")]
+    while stack:
+        submodule, prefix = stack.pop()
         local_metadata = {} if metadata is None else metadata.get(prefix[:-1], {})
         # TODO(zilinzhu): There are some module type may need to be dealt with separately,
         # e.g. BatchNorm, InstanceNorm... (Classes with their own _load_from_state_dict
         # instead of inheriting from nn.Module.)
         _load_from_state_dict(
-            module,
+            submodule,
             client,
             state_dict,
             prefix,
@@ -222,13 +730,84 @@ def load_state_dict(module, client, state_dict, strict=False):
             missing_keys,
             unexpected_keys,
             error_msgs,
+            load_handlers,
+            keys_by_prefix,
         )
-        for name, child in module._modules.items():
+        for name, child in reversed(list(submodule._modules.items())):
             if child is not None:
-                load(child, prefix + name + ".")  # noqa: F821
+                stack.append((child, prefix + name + "."))
+
+    _load_chunks(client, state_dict, chunk_to_load_list, error_msgs, release_loaded)
+
+
+# Log when waiting for the node local checkpoint lock takes longer than this (s).
+_NODE_LOCK_WAIT_LOG_THRESHOLD = 1.0
+
+
+@contextlib.contextmanager
+def _node_local_lock():
+    r"""Hold a lock shared by the processes of the node.
 
-    load(module)
-    del load
+    The node is identified by `SLURM_NODEID` if set, otherwise by the hostname.
+    """
+    import fcntl
+
+    node_id = os.environ.get("SLURM_NODEID", socket.gethostname())
+    lock_path = os.path.join(tempfile.gettempdir(), f"patrickstar_ckpt_{node_id}.lock")
+    with open(lock_path, "a") as lock_file:
+        start_time = time.perf_counter()
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        wait_time = time.perf_counter() - start_time
+        if wait_time > _NODE_LOCK_WAIT_LOG_THRESHOLD:
+            logger.info(f"Waited {wait_time:.2f} s for the checkpoint lock {lock_path}")
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_state_dict(
+    module, client, state_dict, strict=False, mmap=False, serialize_on_node=False
+):
+    r"""Load `state_dict` into `module` and its chunks.
+
+    Args:
+        module: :class:`torch.nn.Module`.
+        client: :class:`PatrickStarClient`.
+        state_dict: dict or str or :class:`os.PathLike`. The state dict, or the
+            path of a checkpoint saved with `torch.save` or `save_state_dict`
+            (ending with ".safetensors"). When a path is given, the checkpoint is
+            loaded on CPU and each tensor is freed once it is copied into the
+            model, so the whole checkpoint is not kept in memory next to the model.
+        strict: bool.
+        mmap: bool. Memory map the checkpoint file instead of reading it into
+            memory, so that tensors are paged in when copied. Only used when
+            `state_dict` is a path saved with `torch.save`, and requires
+            PyTorch >= 2.1. safetensors files are always read into memory,
+            the flag does not apply to them.
+        serialize_on_node: bool. Let only one process of the node load at a
+            time, so that the checkpoints of all local ranks are not in host
+            memory at the same time. Uses a lock file in the temp directory,
+            only supported on Unix.
+    """
+    missing_keys = []
+    unexpected_keys = []
+    error_msgs = []
+
+    if serialize_on_node:
+        lock = _node_local_lock()
+    else:
+        lock = contextlib.nullcontext()
+    with lock:
+        _load_state_dict(
+            module,
+            client,
+            state_dict,
+            mmap,
+            missing_keys,
+            unexpected_keys,
+            error_msgs,
+        )
 
     if unexpected_keys:
         logger.warning(
@@ -35,7 +35,13 @@ from patrickstar.manager import PatrickStarManager
 from patrickstar.ops import FP16Adam
 from patrickstar.utils import logger, global_timer
 
-from .checkpoint import state_dict, load_state_dict
+from .checkpoint import (
+    state_dict,
+    save_state_dict,
+    save_state_dict_async,
+    wait_for_save,
+    load_state_dict,
+)
 
 
 class PatrickStarEngine(torch.nn.Module):
@@ -182,16 +188,33 @@ class PatrickStarEngine(torch.nn.Module):
         mgr.update_margin_mem()
         global_timer.my_timer.finish_profile("BWD")
 
-    def state_dict(self, destination=None, prefix="", keep_vars=False):
+    def state_dict(self, destination=None, prefix="", keep_vars=False, fp16=False):
         return state_dict(
             self.module,
             self.client,
             destination=destination,
             prefix=prefix,
             keep_vars=keep_vars,
+            fp16=fp16,
         )
 
-    def load_state_dict(self, state_dict, strict=False):
+    def save_state_dict(self, path, fp16=False):
+        save_state_dict(self.module, self.client, path, fp16=fp16)
+
+    def save_state_dict_async(self, path, fp16=False):
+        save_state_dict_async(self.module, self.client, path, fp16=fp16)
+
+    def wait_for_save(self):
+        wait_for_save()
+
+    def load_state_dict(
+        self, state_dict, strict=False, mmap=False, serialize_on_node=False
+    ):
         return load_state_dict(
-            self.module, self.client, state_dict=state_dict, strict=strict
+            self.module,
+            self.client,
+            state_dict=state_dict,
+            strict=strict,
+            mmap=mmap,
+            serialize_on_node=serialize_on_node,
         )
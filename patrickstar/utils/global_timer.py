@@ -32,6 +32,10 @@ import time
 from .logging import logger
 from .singleton_meta import SingletonMeta
 
+# Suffix of the profiles measuring the time to enqueue an asynchronous copy,
+# which is not the time of the copy itself.
+ENQUEUE_SUFFIX = "_enqueue"
+
 
 class GlobalTimer(metaclass=SingletonMeta):
     def __init__(self):
@@ -46,13 +50,14 @@ class GlobalTimer(metaclass=SingletonMeta):
     def start_profile(self, key):
         if key in self.start_time:
             assert self.start_time[key] == 0, f"Please Check {key} profiling function"
-        self.start_time[key] = time.time()
+        self.start_time[key] = time.perf_counter()
 
     def finish_profile(self, key):
+        elapse = time.perf_counter() - self.start_time[key]
         if key in self.elapse_stat:
-            self.elapse_stat[key] += time.time() - self.start_time[key]
+            self.elapse_stat[key] += elapse
         else:
-            self.elapse_stat[key] = time.time() - self.start_time[key]
+            self.elapse_stat[key] = elapse
         self.start_time[key] = 0
 
     def reset(self):
@@ -100,7 +105,11 @@ class DataMoveCnter(metaclass=SingletonMeta):
         my_timer = GlobalTimer()
         for k, v in self.times_dict.items():
             bwd = 0
-            if k in my_timer.elapse_stat and self.amount_dict[k] != 0:
+            if (
+                k in my_timer.elapse_stat
+                and self.amount_dict[k] != 0
+                and not k.endswith(ENQUEUE_SUFFIX)
+            ):
                 bwd = self.amount_dict[k] / my_timer.elapse_stat[k]
                 logger.info(
                     f"{k}: {self.amount_dict[k] / 1024 / 1024} MB, {v} times, {bwd / 1024 / 1024} MB/s"
@@ -27,7 +27,9 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import functools
 import gc
+import time
 
 import psutil
 import torch
@@ -35,12 +37,34 @@ import torch
 from .distributed import get_rank, get_world_size
 from .memory import get_memory_info
 
+# The world size does not change once the process group is initialized.
+_world_size = None
+
+
+def _get_world_size():
+    global _world_size
+    if _world_size is None:
+        if not torch.distributed.is_initialized():
+            return get_world_size()
+        _world_size = get_world_size()
+    return _world_size
+
+
+# Reading the memory info opens and parses a file in /sys or /proc. Calls in
+# the same 100ms share the result.
+_MEMORY_INFO_CACHE_BUCKETS_PER_SECOND = 10
+
+
+@functools.lru_cache(maxsize=1)
+def _get_memory_info_in_bucket(time_bucket):
+    return get_memory_info()
+
 
 def get_sys_memory_used(device):
     """
     Get the free memory info of device.
     Notice that for CPU, this function will return 1/N of the total free memory,
-    where N is the world size.
+    where N is the world size. The CPU memory info may be up to 100ms old.
     """
     if device.type == "cuda":
         ret = torch.cuda.memory_allocated()
@@ -48,19 +72,32 @@ def get_sys_memory_used(device):
         if hasattr(torch.cuda, "reset_peak_memory_stats"):  # pytorch 1.4+
             torch.cuda.reset_peak_memory_stats()
     elif device.type == "cpu":
-        mem_info = get_memory_info()
-        ret = mem_info.used / get_world_size()
+        time_bucket = int(time.monotonic() * _MEMORY_INFO_CACHE_BUCKETS_PER_SECOND)
+        mem_info = _get_memory_info_in_bucket(time_bucket)
+        ret = mem_info.used / _get_world_size()
     return ret
 
 
-def see_memory_usage(message, force=False, scale_name="MB"):
+def see_memory_usage(message, force=False, scale_name="MB", collect=False):
+    r"""Print the GPU and CPU memory usage on rank 0.
+
+    Args:
+        message: str. Printed before the memory usage.
+        force: bool. Nothing is printed unless `force` is True.
+        scale_name: str. "MB" or "B".
+        collect: bool. Run `gc.collect()` before reading the memory usage.
+            A full collection can take a long time on large models, so by
+            default it is skipped and the CPU usage may include objects that
+            are unreachable but not collected yet.
+    """
     if not force:
         return
     if not get_rank() == 0:
         return
 
-    # python doesn't do real-time garbage collection so do it explicitly to get the correct RAM reports
-    gc.collect()
+    if collect:
+        # python doesn't do real-time garbage collection so do it explicitly to get the correct RAM reports
+        gc.collect()
 
     if scale_name == "MB":
         scale = 1024 * 1024
@@ -69,17 +106,17 @@ def see_memory_usage(message, force=False, scale_name="MB"):
     # Print message except when distributed but not rank 0
     print(message)
     print(
-        f"MA {round(torch.cuda.memory_allocated() / scale, 2)} {scale_name} \
-        Max_MA {round(torch.cuda.max_memory_allocated() / scale, 2)} {scale_name} \
-        CA {round(torch.cuda.memory_reserved() / scale, 2)} {scale_name} \
-        Max_CA {round(torch.cuda.max_memory_reserved() / scale)} {scale_name} "
+        f"MA {torch.cuda.memory_allocated() / scale:.2f} {scale_name} \
+        Max_MA {torch.cuda.max_memory_allocated() / scale:.2f} {scale_name} \
+        CA {torch.cuda.memory_reserved() / scale:.2f} {scale_name} \
+        Max_CA {torch.cuda.max_memory_reserved() / scale:.0f} {scale_name} "
     )
 
     # TODO(zilinzhu) Find how to get the available and percent value of the
     # memory in docker to substitute psutil.virtual_memory to get_memory_info.
     vm_stats = psutil.virtual_memory()
-    used_gb = round(((vm_stats.total - vm_stats.available) / (1024 ** 3)), 2)
-    print(f"CPU Virtual Memory: used = {used_gb} GB, percent = {vm_stats.percent}%")
+    used_gb = (vm_stats.total - vm_stats.available) / (1024 ** 3)
+    print(f"CPU Virtual Memory: used = {used_gb:.2f} GB, percent = {vm_stats.percent}%")
 
     # get the peak memory to report correct data, so reset the counter for the next call
     if hasattr(torch.cuda, "reset_peak_memory_stats"):  # pytorch 1.4+
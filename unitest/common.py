@@ -27,16 +27,44 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import contextlib
 import os
 import time
+from types import SimpleNamespace
+from unittest import mock
 
 import torch
 from torch.multiprocessing import Process
 
+from patrickstar.manager import PatrickStarManager
+from patrickstar.utils import SingletonMeta
+
 # Worker timeout *after* the first worker has completed.
 UNIT_WORKER_TIMEOUT = 120
 
 
+@contextlib.contextmanager
+def fake_cuda_manager(gpu_total_memory=16 * 1024**3):
+    r"""Create a fresh :class:`PatrickStarManager` without using CUDA.
+
+    The copy stream and the device properties are mocked, so that the chunk
+    memory bookkeeping can be tested in the test process. The manager is
+    dropped on exit.
+
+    Args:
+        gpu_total_memory: int. The total memory of the fake GPU (Bytes).
+    """
+    SingletonMeta._instances.pop(PatrickStarManager, None)
+    with mock.patch("torch.cuda.Stream"), mock.patch(
+        "torch.cuda.get_device_properties",
+        return_value=SimpleNamespace(total_memory=gpu_total_memory),
+    ):
+        try:
+            yield PatrickStarManager(0)
+        finally:
+            SingletonMeta._instances.pop(PatrickStarManager, None)
+
+
 def distributed_test(world_size=2, backend="nccl", use_fake_dist=False):
     r"""A decorator for executing a function (e.g., a unit test) in a distributed manner.
 
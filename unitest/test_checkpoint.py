@@ -30,6 +30,7 @@
 import logging
 import unittest
 
+import pytest
 import torch
 from transformers import BertConfig, BertForSequenceClassification
 
@@ -47,6 +48,7 @@ def bert_model(
     sequence_length=512,
     num_layer=12,
     num_head=12,
+    use_safetensors=False,
 ):
     # Avoid gpu0 use more memory.
     # https://discuss.pytorch.org/t/extra-10gb-memory-on-gpu-0-in-ddp-tutorial/118113
@@ -135,7 +137,11 @@ def bert_model(
 
     # Save checkpoints.
     rank = torch.distributed.get_rank()
-    torch.save(model.state_dict(), f"model-{rank}.pt")
+    if use_safetensors:
+        # The file is written while training goes on.
+        model.save_state_dict_async(f"model-{rank}.safetensors")
+    else:
+        torch.save(model.state_dict(), f"model-{rank}.pt")
     torch.save(optimizer.state_dict(), f"optimizer-{rank}.pt")
 
     # Train 5 more steps and keep the data.
@@ -154,9 +160,13 @@ def bert_model(
     print("loss after 10 steps:", loss1)
 
     # Load checkpoint.
-    model_state_dict = torch.load(f"model-{rank}.pt")
+    if use_safetensors:
+        model.wait_for_save()
+        model.load_state_dict(f"model-{rank}.safetensors")
+    else:
+        model_state_dict = torch.load(f"model-{rank}.pt")
+        model.load_state_dict(model_state_dict)
     opt_state_dict = torch.load(f"optimizer-{rank}.pt")
-    model.load_state_dict(model_state_dict)
     optimizer.load_state_dict(opt_state_dict)
 
     # The loss after checkpoint loading.
@@ -204,6 +214,21 @@ class TestModelInitContext(unittest.TestCase):
             num_head=num_head,
         )
 
+    def test_checkpoint_safetensors(self):
+        pytest.importorskip("safetensors")
+        self._test_checkpoint_safetensors()
+
+    @distributed_test(world_size=[1], backend="gloo", use_fake_dist=False)
+    def _test_checkpoint_safetensors(self):
+        bert_model(
+            hidden_dim=768,
+            batch_size=2,
+            sequence_length=512,
+            num_layer=6,
+            num_head=12,
+            use_safetensors=True,
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
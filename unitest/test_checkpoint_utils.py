@@ -0,0 +1,227 @@
+# BSD 3-Clause License
+#
+# Copyright (C) 2021 THL A29 Limited, a Tencent company.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+#  * Neither the name of the psutil authors nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import torch
+
+from patrickstar.runtime.checkpoint import (
+    _group_keys_by_prefix,
+    _tiled_copy,
+    load_state_dict,
+    state_dict,
+)
+
+
+class _FakeChunk(object):
+    def __init__(self, payload):
+        self.payload = payload
+
+    def get_device(self):
+        return self.payload.device
+
+    def wait_copy(self):
+        pass
+
+
+class _FakeChunkList(object):
+    def __init__(self):
+        self.chunks = {}
+
+    def __getitem__(self, chunk_id):
+        return self.chunks[chunk_id]
+
+    def access_chunk(self, chunk_id, compute_device):
+        pass
+
+
+class _FakeClient(object):
+    r"""A client keeping the fp32 copy of the chunk based params in CPU chunks.
+
+    The params not added with `add_chunk` are treated as torch based.
+    """
+
+    def __init__(self):
+        self.chunk_list = _FakeChunkList()
+        self.chunk_tensor_index = self
+        self.tensor_infos = []
+
+    def add_chunk(self, chunk_id, params, payload):
+        self.chunk_list.chunks[chunk_id] = _FakeChunk(payload)
+        start_offset = 0
+        for param in params:
+            tensor_id = len(self.tensor_infos)
+            param.ps_attr = SimpleNamespace(
+                shape=param.shape, data_id=lambda tensor_id=tensor_id: tensor_id
+            )
+            self.tensor_infos.append(
+                SimpleNamespace(
+                    chunk_id=chunk_id, start_offset=start_offset, numel=param.numel()
+                )
+            )
+            start_offset += param.numel()
+
+    def get_tensor_info(self, tensor_id):
+        return self.tensor_infos[tensor_id]
+
+    def get_param_info(self, param):
+        if isinstance(param, torch.nn.Parameter) and hasattr(param, "ps_attr"):
+            return (False, True, True, param)
+        return None
+
+
+class TestCheckpointUtils(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def test_group_keys_by_prefix(self):
+        state_dict = OrderedDict(
+            [
+                ("a.weight", None),
+                ("a.b.weight", None),
+                ("a.b.bias", None),
+                ("a.bc.weight", None),
+                ("c", None),
+            ]
+        )
+        keys_by_prefix = _group_keys_by_prefix(state_dict)
+
+        self.assertEqual(
+            keys_by_prefix,
+            {
+                "": {
+                    "a": ["a.weight", "a.b.weight", "a.b.bias", "a.bc.weight"],
+                    "c": ["c"],
+                },
+                "a.": {
+                    "weight": ["a.weight"],
+                    "b": ["a.b.weight", "a.b.bias"],
+                    "bc": ["a.bc.weight"],
+                },
+                "a.b.": {"weight": ["a.b.weight"], "bias": ["a.b.bias"]},
+                "a.bc.": {"weight": ["a.bc.weight"]},
+            },
+        )
+        self.assertEqual(_group_keys_by_prefix({}), {})
+
+    def _check_tiled_copy(self, src, first_dtype, second_dtype, tile_numel):
+        first_copy = torch.zeros(src.shape, dtype=first_dtype)
+        second_copy = torch.zeros(src.shape, dtype=second_dtype)
+        _tiled_copy(first_copy, second_copy, src, tile_numel=tile_numel)
+        self.assertTrue(torch.equal(first_copy, src.to(first_dtype)))
+        self.assertTrue(torch.equal(second_copy, first_copy.to(second_dtype)))
+
+    def test_tiled_copy(self):
+        # Smaller than a tile.
+        self._check_tiled_copy(torch.randn(3), torch.float, torch.half, 4)
+        # 1-D, with a tail tile of 2 elements.
+        self._check_tiled_copy(torch.randn(10), torch.float, torch.half, 4)
+        # fp16 checkpoint tensor, read into the fp16 copy first.
+        self._check_tiled_copy(torch.randn(10).half(), torch.half, torch.float, 4)
+        # Non contiguous, 2 rows of 6 per tile and a tail tile of 1 row.
+        src = torch.randn(6, 5).t()
+        self.assertFalse(src.is_contiguous())
+        self._check_tiled_copy(src, torch.float, torch.half, 12)
+        # Rows larger than a tile are copied one at a time.
+        self._check_tiled_copy(torch.randn(3, 10), torch.float, torch.half, 4)
+        # Non contiguous along the leading dimension.
+        src = torch.randn(10, 4)[::2]
+        self.assertFalse(src.is_contiguous())
+        self._check_tiled_copy(src, torch.float, torch.half, 8)
+
+    def test_state_dict_hooks(self):
+        model = torch.nn.Sequential(torch.nn.Linear(2, 3), torch.nn.Linear(3, 1))
+        client = _FakeClient()
+        # The values in the chunk differ from the params, to check where they
+        # are read from.
+        payload = torch.arange(9, dtype=torch.float)
+        client.add_chunk(0, [model[0].weight, model[0].bias], payload)
+
+        seen_values = {}
+
+        def record_hook(module, destination, prefix, local_metadata):
+            for key, value in destination.items():
+                seen_values[key] = value
+
+        def rename_hook(module, destination, prefix, local_metadata):
+            renamed = OrderedDict(
+                ("renamed." + key, value) for key, value in destination.items()
+            )
+            renamed._metadata = destination._metadata
+            return renamed
+
+        model[1]._register_state_dict_hook(record_hook)
+        model._register_state_dict_hook(rename_hook)
+        result = state_dict(model, client)
+
+        # The hooks see the values of the chunk based params.
+        self.assertTrue(torch.equal(seen_values["0.weight"], payload[:6].view(3, 2)))
+        self.assertTrue(torch.equal(seen_values["0.bias"], payload[6:]))
+        self.assertEqual(
+            list(result.keys()),
+            [
+                "renamed.0.weight",
+                "renamed.0.bias",
+                "renamed.1.weight",
+                "renamed.1.bias",
+            ],
+        )
+        self.assertTrue(torch.equal(result["renamed.0.weight"], payload[:6].view(3, 2)))
+        self.assertTrue(torch.equal(result["renamed.1.weight"], model[1].weight))
+
+    def test_load_unexpected_keys(self):
+        model = torch.nn.Sequential(torch.nn.Linear(2, 3), torch.nn.Linear(3, 1))
+        client = _FakeClient()
+        checkpoint = OrderedDict(
+            (key, torch.randn(value.shape)) for key, value in model.state_dict().items()
+        )
+
+        load_state_dict(model, client, checkpoint, strict=True)
+        self.assertTrue(torch.equal(model[0].weight, checkpoint["0.weight"]))
+
+        with self.assertRaises(RuntimeError):
+            load_state_dict(
+                model, client, dict(checkpoint, bogus=torch.zeros(1)), strict=True
+            )
+
+        # A key added by a load pre hook is unexpected too.
+        def add_key_hook(state_dict, prefix, *args):
+            state_dict[prefix + "bogus"] = torch.zeros(1)
+
+        model[0]._register_load_state_dict_pre_hook(add_key_hook)
+        with self.assertRaises(RuntimeError):
+            load_state_dict(model, client, checkpoint, strict=True)
+        # The dict of the caller is not modified by the hook.
+        self.assertNotIn("0.bogus", checkpoint)
+
+
+if __name__ == "__main__":
+    unittest.main()
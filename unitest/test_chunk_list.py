@@ -27,14 +27,37 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import gc
 import unittest
+from unittest import mock
 
 import torch
 
-from common import distributed_test
+from common import distributed_test, fake_cuda_manager
 from patrickstar.core import ChunkList, ChunkState, ChunkType
 
 
+class _FakeCudart(object):
+    r"""Records the host memory registered with `cudaHostRegister`."""
+
+    def __init__(self):
+        self.registered = set()
+
+    def cudaHostRegister(self, ptr, size, flags):
+        if ptr in self.registered:
+            # cudaErrorHostMemoryAlreadyRegistered
+            return 712
+        self.registered.add(ptr)
+        return 0
+
+    def cudaHostUnregister(self, ptr):
+        if ptr not in self.registered:
+            # cudaErrorHostMemoryNotRegistered
+            return 713
+        self.registered.remove(ptr)
+        return 0
+
+
 class TestChunkData(unittest.TestCase):
     def setUp(self):
         pass
@@ -96,6 +119,136 @@ class TestChunkData(unittest.TestCase):
             chunk_list.last_chunk_id(ChunkType.PARAM_FP32), 1, "check last_chunk_id"
         )
 
+    def test_pinned_pool(self):
+        cudart = _FakeCudart()
+        with mock.patch("torch.cuda.cudart", return_value=cudart):
+            chunk_list = ChunkList(0)
+
+            buf = chunk_list.acquire_pinned(20, torch.float)
+            self.assertEqual(buf.numel(), 20)
+            self.assertEqual(buf.dtype, torch.float)
+            self.assertIn(buf.data_ptr(), cudart.registered)
+
+            # A released buffer is reused for the same capacity and dtype.
+            chunk_list.release_pinned(buf)
+            reused_buf = chunk_list.acquire_pinned(20, torch.float)
+            self.assertEqual(reused_buf.data_ptr(), buf.data_ptr())
+
+            # But not for another dtype or capacity.
+            chunk_list.release_pinned(reused_buf)
+            half_buf = chunk_list.acquire_pinned(20, torch.half)
+            self.assertEqual(half_buf.dtype, torch.half)
+            self.assertNotEqual(half_buf.data_ptr(), buf.data_ptr())
+            large_buf = chunk_list.acquire_pinned(40, torch.float)
+            self.assertEqual(large_buf.numel(), 40)
+            self.assertNotEqual(large_buf.data_ptr(), buf.data_ptr())
+
+            # The released buffer is still in the pool, and only given out once.
+            self.assertEqual(
+                chunk_list.acquire_pinned(20, torch.float).data_ptr(), buf.data_ptr()
+            )
+            self.assertNotEqual(
+                chunk_list.acquire_pinned(20, torch.float).data_ptr(), buf.data_ptr()
+            )
+            chunk_list.close()
+
+    def test_chunk_to_move_out(self):
+        cudart = _FakeCudart()
+        with fake_cuda_manager() as mgr, mock.patch(
+            "torch.cuda.cudart", return_value=cudart
+        ):
+            compute_device = torch.device("cpu:0")
+            chunk_list = ChunkList(0)
+
+            chunk_size_list = [20, 40, 20, 80, 40, 20, 60]
+            # Some chunks share the next moment, they are ordered by chunk_id.
+            next_mom_list = [3, 7, 7, 1, 9, 5, 7]
+            for chunk_id, chunk_size in enumerate(chunk_size_list):
+                chunk_list.new_chunk(
+                    chunk_id=chunk_id,
+                    chunk_size=chunk_size,
+                    data_type=torch.float,
+                    is_dummy=False,
+                    chunk_type=ChunkType.PARAM_FP32,
+                )
+
+            # Record the access moments in a warmup iteration, then move back
+            # to the first moment of the next iteration.
+            mgr.start_train(param_fp16_chunk_size=0, chunk_size=0)
+            for mom in range(10):
+                for chunk_id, next_mom in enumerate(next_mom_list):
+                    if next_mom == mom:
+                        chunk_list.access_chunk(chunk_id, compute_device)
+                mgr.metronome.tiktac()
+            mgr.is_warmup = False
+            mgr.metronome.reset()
+
+            def chunk_to_move_out_by_sort(size_in_bytes):
+                # The selection before only picking the first candidates.
+                moved_bytes = 0
+                moved_list = []
+                for _, chunk_id in sorted(
+                    (-chunk.next_accessed_mom(compute_device), chunk_id)
+                    for chunk_id, chunk in chunk_list.generate_chunk()
+                ):
+                    moved_bytes += chunk_list[chunk_id].get_payload_space()
+                    moved_list.append(chunk_id)
+                    if moved_bytes >= size_in_bytes:
+                        break
+                return moved_list
+
+            # The chunk accessed last is moved first, then the ones of moment 7
+            # by chunk_id.
+            self.assertEqual(
+                chunk_list._chunk_to_move_out_for_room_making(200, compute_device),
+                [4, 1],
+            )
+            total_bytes = sum(chunk_size_list) * 4
+            for size_in_bytes in [1, 80, 81, 240, 400, 700, total_bytes]:
+                self.assertEqual(
+                    chunk_list._chunk_to_move_out_for_room_making(
+                        size_in_bytes, compute_device
+                    ),
+                    chunk_to_move_out_by_sort(size_in_bytes),
+                    f"size_in_bytes {size_in_bytes}",
+                )
+            with self.assertRaises(RuntimeError):
+                chunk_list._chunk_to_move_out_for_room_making(
+                    total_bytes + 1, compute_device
+                )
+            chunk_list.close()
+
+    def test_pinned_register(self):
+        cudart = _FakeCudart()
+        with mock.patch("torch.cuda.cudart", return_value=cudart):
+            chunk_list = ChunkList(0)
+
+            buf = chunk_list.acquire_pinned(20, torch.float)
+            ptr = buf.data_ptr()
+            self.assertEqual(cudart.registered, {ptr})
+
+            # A pooled buffer is reused without registering it again.
+            chunk_list.release_pinned(buf)
+            del buf
+            buf = chunk_list.acquire_pinned(20, torch.float)
+            self.assertEqual(buf.data_ptr(), ptr)
+            self.assertEqual(cudart.registered, {ptr})
+
+            # A dropped buffer stays registered until close, then is unregistered.
+            del buf
+            chunk_list.close()
+            self.assertEqual(cudart.registered, set())
+
+            # The memory can be allocated and registered again.
+            buf = chunk_list.acquire_pinned(20, torch.float)
+            self.assertEqual(cudart.registered, {buf.data_ptr()})
+            del buf
+
+            # A collected chunk list unregisters its buffers.
+            del chunk_list
+            gc.collect()
+            self.assertEqual(cudart.registered, set())
+
 
 if __name__ == "__main__":
 
@@ -169,6 +169,29 @@ class TestAccess(unittest.TestCase):
         )
         self.assertTrue(is_success)
 
+    def test_insert_tensor_into_gap(self):
+        chunk_tensor_index = ChunkTensorIndex(20)
+        param_list = []
+        for param_id, numel in enumerate([7, 6, 5]):
+            param = torch.nn.Parameter(torch.zeros(numel))
+            register_param(
+                param, ParamType.CHUNK_BASED, torch.float, f"param_{param_id}"
+            )
+            self.assertTrue(
+                chunk_tensor_index.try_insert_tensor(0, param, AccessType.DATA)
+            )
+            param_list.append(param)
+
+        # 7, (6), 5
+        chunk_tensor_index.delete_tensor(0, param_list[1], AccessType.DATA)
+
+        param = torch.nn.Parameter(torch.zeros(4))
+        register_param(param, ParamType.CHUNK_BASED, torch.float, "param_gap")
+        self.assertTrue(chunk_tensor_index.try_insert_tensor(0, param, AccessType.DATA))
+        tensor_info = chunk_tensor_index.get_tensor_info(param.ps_attr.data_id())
+        self.assertEqual(tensor_info.start_offset, 7)
+        self._check_order(chunk_tensor_index, 0)
+
     def test_chunk_layout_consistency(self):
         r"""
         Check if the chunk layout of optimizer state are aligned to
@@ -29,10 +29,11 @@
 
 import logging
 import unittest
+import weakref
 
 import torch
 
-from common import distributed_test
+from common import distributed_test, fake_cuda_manager
 from patrickstar import PatrickStarManager
 from patrickstar.core import PatrickStarClient, AccessType, register_param, ChunkType
 from patrickstar.core.parameter import ParamType
@@ -108,6 +109,45 @@ class TestClientAccess(unittest.TestCase):
             self.assertEqual(torch.max(real_payload - payload_ref), 0)
             self.client.release_data(param)
 
+    def test_get_param_info(self):
+        with fake_cuda_manager():
+            self.client = PatrickStarClient(
+                rank=0, default_chunk_size=self.default_chunk_size
+            )
+
+        param = torch.nn.Parameter(torch.rand(10).half())
+        register_param(param, ParamType.CHUNK_BASED, torch.half, "param_0")
+        param_fp32 = torch.nn.Parameter(torch.rand(10))
+        register_param(param_fp32, ParamType.CHUNK_BASED, torch.float, "param_0")
+        self.client.param_fp16_to_param_fp32_map[param] = param_fp32
+        dummy_param = torch.nn.Parameter(torch.rand(10))
+        register_param(dummy_param, ParamType.TORCH_BASED, torch.float, "dummy_0")
+
+        param_info = self.client.get_param_info(param)
+        self.assertEqual(param_info[:3], (False, True, True))
+        self.assertIs(param_info[3], param_fp32)
+        self.assertEqual(
+            self.client.get_param_info(dummy_param), (True, True, False, None)
+        )
+        # The info stays the same across calls.
+        self.assertEqual(self.client.get_param_info(param), param_info)
+
+        # Unregistered params are not cached as None, their info is available
+        # once they are registered.
+        late_param = torch.nn.Parameter(torch.rand(10))
+        self.assertIsNone(self.client.get_param_info(late_param))
+        register_param(late_param, ParamType.TORCH_BASED, torch.float, "param_1")
+        self.assertEqual(
+            self.client.get_param_info(late_param), (False, True, False, None)
+        )
+
+        # Buffers are not kept alive by the client.
+        buffer = torch.rand(10)
+        self.assertIsNone(self.client.get_param_info(buffer))
+        buffer_ref = weakref.ref(buffer)
+        del buffer
+        self.assertIsNone(buffer_ref())
+
 
 if __name__ == "__main__":
 
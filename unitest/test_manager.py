@@ -0,0 +1,71 @@
+# BSD 3-Clause License
+#
+# Copyright (C) 2021 THL A29 Limited, a Tencent company.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#  * Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+#  * Neither the name of the psutil authors nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from common import fake_cuda_manager
+
+
+class TestManager(unittest.TestCase):
+    def setUp(self):
+        manager_context = fake_cuda_manager()
+        self.mgr = manager_context.__enter__()
+        self.addCleanup(manager_context.__exit__, None, None, None)
+
+    def test_transfer(self):
+        mgr = self.mgr
+        mgr.add("cpu", 100)
+        mgr.add("cuda", 40)
+
+        mgr.transfer("cpu", "cuda", 30)
+        self.assertEqual(mgr.used_chunk_mem("cpu"), 70)
+        self.assertEqual(mgr.used_chunk_mem("cuda"), 70)
+
+        mgr.transfer("cuda", "cpu", 50)
+        self.assertEqual(mgr.used_chunk_mem("cpu"), 120)
+        self.assertEqual(mgr.used_chunk_mem("cuda"), 20)
+
+        # Moving within a device does not change anything.
+        mgr.transfer("cuda", "cuda", 20)
+        self.assertEqual(mgr.used_chunk_mem("cpu"), 120)
+        self.assertEqual(mgr.used_chunk_mem("cuda"), 20)
+
+        # Same as delete followed by add.
+        mgr.delete("cpu", 10)
+        mgr.add("cuda", 10)
+        self.assertEqual(mgr.used_chunk_mem("cpu"), 110)
+        self.assertEqual(mgr.used_chunk_mem("cuda"), 30)
+
+        with self.assertRaises(RuntimeError):
+            mgr.transfer("cpu", "xla", 10)
+        self.assertEqual(mgr.used_chunk_mem("cpu"), 110)
+
+
+if __name__ == "__main__":
+    unittest.main()